@@ -1,33 +1,203 @@
 import asyncio
+import functools
+import math
+import random
+import signal
 import websockets
 import json
-import paho.mqtt.client as mqtt
-from database.conn import connectToDatabase
+import time
+from datetime import datetime
+from http import HTTPStatus
+from database.conn import activateDatabaseContext, closeDatabase, connectToDatabase
+from services.admission import AdmissionControl, ClientLimits, Overloaded
+from services.batcher import MessageBatcher
+from services.broadcaster import Broadcaster
+from services.dispatch import handlers
+from services.cluster import (
+    FLUSH,
+    INGEST,
+    MESSAGE,
+    STANDALONE,
+    STATS,
+    WORKER,
+    BusClient,
+    BusHub,
+    aggregate_stats,
+    node_id,
+    run_cluster
+)
+from services.frames import Frame, FrameEncoder, negotiate_format
+from services.history import ReadingHistory, replay_request
+from services.ingestion import AsyncMQTTSource, IngestBuffer
+from services.liveStats import stats_topic
+from services.logConfig import configure_logging, log_payload
+from services.metrics import HANDLER_LATENCY, MQTT_TO_BROADCAST, REJECTED_CLIENTS, registry
+from services.statsEngine import stats_engine
+from services.topicTrie import TopicTrie
+from services.writeBehind import writer
+from services.statsCache import stats_cache
 from controllers.statisticsController import (
+    PERIODS,
+    SENSOR_MODELS,
+    STATS_MODELS,
+    live_stats,
+    spool,
+    drain_spool,
+    persistSensorReading,
     insertBpm,
     insertTemp,
     getBPMRecords,
-    getTempRecords
+    getTempRecords,
+    getCacheStats,
+    getHistorySeries,
+    getLiveStats
 )
 from loguru import logger
 from dotenv import load_dotenv
 import os
-from typing import Set
-from queue import Queue
-from threading import Lock
+from typing import Any, Dict, KeysView, List, Set
 
 load_dotenv()
 
+MQTT_TOPICS = [
+    "message/event",
+    "sensor/distancia",
+    "sensor/bpm",
+    "sensor/temperatura",
+    "sensor/toque"
+]
+
+# Código de cierre WebSocket "Service Restart" al detener el servicio
+RESTART_CLOSE_CODE = 1012
+
+# Código de cierre "Policy Violation" para clientes que no respetan los límites de tasa
+POLICY_CLOSE_CODE = 1008
+
+# Código de cierre "Try Again Later" si se llegó a WS_MAX_CLIENTS durante el handshake
+TRY_AGAIN_CLOSE_CODE = 1013
+
+# Puntos por trama al enviar una serie histórica
+HISTORY_CHUNK_SIZE = int(os.getenv("HISTORY_CHUNK_SIZE", 500))
+if HISTORY_CHUNK_SIZE <= 0:
+    raise ValueError(f"HISTORY_CHUNK_SIZE debe ser positivo: {HISTORY_CHUNK_SIZE}")
+
+# Eventos WebSocket atendidos por los controladores; los del propio bridge se registran en sus métodos
+@handlers.event("getBPMRecords", db=True)
+async def _get_bpm_records(bridge, websocket, parsed_data: Dict[str, Any]):
+    return await getBPMRecords(parsed_data.get("tiempo"), parsed_data)
+
+@handlers.event("getTempRecords", db=True)
+async def _get_temp_records(bridge, websocket, parsed_data: Dict[str, Any]):
+    return await getTempRecords(parsed_data.get("tiempo"), parsed_data)
+
+@handlers.event("insertBPMRecords", db=True)
+async def _insert_bpm_records(bridge, websocket, parsed_data: Dict[str, Any]):
+    return await insertBpm(parsed_data)
+
+@handlers.event("insertTempRecords", db=True)
+async def _insert_temp_records(bridge, websocket, parsed_data: Dict[str, Any]):
+    return await insertTemp(parsed_data)
+
+@handlers.event("getCacheStats")
+async def _get_cache_stats(bridge, websocket, parsed_data: Dict[str, Any]):
+    return await getCacheStats()
+
+@handlers.event("getHistorySeries", db=True)
+async def _get_history_series(bridge, websocket, parsed_data: Dict[str, Any]):
+    """Envía la serie en tramas de HISTORY_CHUNK_SIZE puntos; la última es la respuesta del evento."""
+    response = await getHistorySeries(parsed_data)
+    if not response.get('success'):
+        return response
+
+    fechas = response.pop('fechas')
+    valores = response.pop('valores')
+    starts = range(0, max(len(fechas), 1), HISTORY_CHUNK_SIZE)
+    request_id = parsed_data.get("requestId")
+    for index, start in enumerate(starts):
+        chunk = {
+            **response,
+            'chunk': index,
+            'chunks': len(starts),
+            'final': index == len(starts) - 1,
+            'fechas': fechas[start:start + HISTORY_CHUNK_SIZE],
+            'valores': valores[start:start + HISTORY_CHUNK_SIZE]
+        }
+        if chunk['final']:
+            return chunk
+        if request_id is not None:
+            chunk['requestId'] = request_id
+        await websocket.send(json.dumps(chunk))
+
 class WebSocketMQTTBridge:
     def __init__(self):
-        self.connected_clients: Set[websockets.WebSocketServerProtocol] = set()
-        self.mqtt_client = self._setup_mqtt_client()
-        self.message_queue = Queue()
+        self.broadcaster = Broadcaster()
+        self.frame_encoder = FrameEncoder()
+        self.batcher = MessageBatcher(self._broadcast_batch)
+        self.message_queue = IngestBuffer(self._process_message)
+        self.history = ReadingHistory()
         self.event_loop = None
-        self.lock = Lock()
+        self.server = None
+
+        # El listener abre mientras la base conecta; los eventos con db=True esperan a db_ready
+        self.db_ready = asyncio.Event()
+
+        # Apagado: SHUTDOWN_TIMEOUT segundos para entregar lo pendiente y cerrar los sockets;
+        # cada cliente recibe un tiempo de reconexión al azar de hasta SHUTDOWN_RECONNECT_JITTER_MS
+        self.shutdown_timeout = float(os.getenv("SHUTDOWN_TIMEOUT", 10))
+        self.reconnect_jitter = float(os.getenv("SHUTDOWN_RECONNECT_JITTER_MS", 5000))
+        self.draining = False
+        self.stopped = False
+        self._stop_requested = asyncio.Event()
+
+        # Rol en el clúster: "standalone", "ingest" (solo MQTT) o "worker" (solo WebSockets)
+        self.role = os.getenv("CLUSTER_ROLE", STANDALONE)
+        self.node_id = node_id(self.role)
+        self.bus = None
+        self.bus_task = None
+        self.stats_task = None
+        self.stats_interval = float(os.getenv("CLUSTER_STATS_INTERVAL", 5))
+        # Últimos contadores recibidos de los demás nodos
+        self.cluster_stats: Dict[str, Dict[str, Any]] = {}
+        if self.role != STANDALONE:
+            writer.add_flush_listener(self._share_flush)
+
+        # "thread": paho con su hilo de red; "asyncio": aiomqtt dentro del event loop
+        self.mqtt_mode = os.getenv("MQTT_CLIENT_MODE", "thread")
+        self.mqtt_client = self._setup_mqtt_client() if self.mqtt_mode == "thread" and self.role != WORKER else None
+        self.mqtt_task = None
+
+        # Las estadísticas en vivo se difunden por los mismos tópicos que MQTT
+        live_stats.publisher = self._publish_stats
+
+        # Métricas leídas al exportar; se sirven en METRICS_PATH y con el evento getMetrics
+        self.metrics_path = os.getenv("METRICS_PATH", "/metrics")
+
+        # Solicitudes que un mismo cliente puede tener en curso a la vez
+        self.max_inflight = int(os.getenv("WS_MAX_INFLIGHT", 4))
+        # Límites de tasa, de clientes y de consultas simultáneas a la base
+        self.admission = AdmissionControl()
+        # Tamaño máximo de un mensaje entrante y mensajes entrantes en espera por conexión
+        self.max_message_size = int(os.getenv("WS_MAX_MESSAGE_BYTES", 64 * 1024))
+        self.max_incoming_queue = int(os.getenv("WS_MAX_QUEUE", 16))
+        self._register_metrics()
+
+        # Persistir automáticamente las lecturas de sensor/bpm y sensor/temperatura
+        # (en un clúster solo el nodo de ingesta recibe MQTT)
+        self.persist_mqtt = os.getenv("PERSIST_MQTT_READINGS", "false").lower() == "true" and self.role != WORKER
+        # Las lecturas persistidas pasan por el spool en disco: la ingesta no depende de la latencia de la base
+        self.use_spool = self.persist_mqtt and os.getenv("SPOOL_ENABLED", "true").lower() == "true"
+        self.spool_task = None
+
+    @property
+    def connected_clients(self) -> KeysView[websockets.WebSocketServerProtocol]:
+        """Clientes WebSocket conectados actualmente."""
+        return self.broadcaster.sessions.keys()
         
-    def _setup_mqtt_client(self) -> mqtt.Client:
+    def _setup_mqtt_client(self) -> Any:
         """Configura y retorna un cliente MQTT."""
+        # paho solo se importa en los nodos que reciben MQTT por hilo
+        import paho.mqtt.client as mqtt
+
         client = mqtt.Client()
         client.on_message = self._on_mqtt_message
         client.on_connect = self._on_mqtt_connect
@@ -43,11 +213,8 @@ class WebSocketMQTTBridge:
         """Callback cuando el cliente MQTT se conecta."""
         if rc == 0:
             logger.info("Conectado al broker MQTT")
-            client.subscribe("message/event")
-            client.subscribe("sensor/distancia")
-            client.subscribe("sensor/bpm")
-            client.subscribe("sensor/temperatura")
-            client.subscribe("sensor/toque")
+            for topic in MQTT_TOPICS:
+                client.subscribe(topic)
         else:
             logger.error(f"Error de conexión MQTT con código: {rc}")
 
@@ -57,150 +224,617 @@ class WebSocketMQTTBridge:
     
     def _on_mqtt_message(self, client, userdata, msg):
         """Callback para manejar mensajes MQTT recibidos."""
+        self._ingest(msg.topic, msg.payload)
+
+    def _ingest(self, topic: str, payload: bytes):
+        """Valida un mensaje MQTT y lo entrega al buffer de ingesta."""
         try:
-            message_data = {
-                "topic": msg.topic,
-                "parsedData": json.loads(msg.payload.decode())
-            }
-            message_json = json.dumps(message_data)
-            
-            # Agregar el mensaje a la cola
-            self.message_queue.put(message_json)
-            
-            # Notificar al event loop que hay un nuevo mensaje
-            with self.lock:
-                if self.event_loop is not None:
-                    self.event_loop.call_soon_threadsafe(self._process_message_queue)
-                    
+            # El payload validado se empalma tal cual en el sobre JSON
+            frame = self.frame_encoder.build(topic, payload)
+            self.message_queue.put(frame)
         except Exception as e:
             logger.error(f"Error en callback MQTT: {e}")
 
-    def _process_message_queue(self):
-        """Procesa los mensajes en la cola."""
+    def _process_message(self, frame: Frame):
+        """Procesa un mensaje drenado del buffer de ingesta dentro del event loop."""
+        if self.persist_mqtt and frame.topic in SENSOR_MODELS:
+            try:
+                persistSensorReading(frame.topic, frame.data)
+            except Exception as e:
+                logger.error(f"Error persistiendo lectura de {frame.topic}: {e}")
+
+        if self.role == INGEST:
+            # Cada worker difunde el mensaje a sus propios clientes
+            self.bus.publish(MESSAGE, frame.topic, frame.text.encode())
+            return
+
+        self.history.record(frame.topic, frame.data)
+
+        if self.batcher.enabled:
+            self.batcher.add(frame)
+        else:
+            self._broadcast_message(frame.topic, frame)
+            MQTT_TO_BROADCAST.observe(time.perf_counter() - frame.received)
+
+    def _broadcast_message(self, topic: str, message: Frame):
+        """Encola un mensaje en la cola de salida de los clientes suscritos al tópico."""
+        if not self.broadcaster.sessions:
+            return
+
+        self.broadcaster.publish(topic, message)
+
+    def _broadcast_batch(self, frames: List[Frame]):
+        """Entrega un lote de tramas como un único arreglo por cliente."""
+        if not self.broadcaster.sessions:
+            return
+
+        self.broadcaster.publish_batch(frames)
+        now = time.perf_counter()
+        for frame in frames:
+            MQTT_TO_BROADCAST.observe(now - frame.received)
+
+    def _publish_stats(self, topic: str, data: Dict[str, Any]):
+        """Difunde una estadística actualizada a los clientes suscritos a ella."""
+        self._broadcast_message(topic, Frame(topic, data, backend=self.frame_encoder.backend))
+
+    def _register_metrics(self):
+        """Registra los medidores que se calculan a partir del estado del bridge."""
+        registry.gauge("bridge_ws_clients", "Clientes WebSocket conectados", function=lambda: len(self.broadcaster.sessions))
+        registry.gauge("bridge_ws_queued_messages", "Mensajes pendientes en las colas de los clientes",
+                       function=lambda: sum(session.lag for session in self.broadcaster.sessions.values()))
+        registry.gauge("bridge_ingest_queue_depth", "Mensajes MQTT pendientes en el buffer de ingesta",
+                       function=lambda: self.message_queue.depth)
+        registry.gauge("bridge_ingest_queue_high_water", "Máxima profundidad del buffer de ingesta",
+                       function=lambda: self.message_queue.high_water)
+        registry.counter("bridge_ingest_received_total", "Mensajes MQTT recibidos", function=lambda: self.message_queue.received)
+        registry.counter("bridge_ingest_dropped_total", "Mensajes MQTT descartados por buffer lleno",
+                         function=lambda: self.message_queue.dropped)
+        registry.gauge("bridge_write_pending", "Lecturas pendientes de escritura", function=lambda: writer.pending)
+        registry.counter("bridge_write_failed_total", "Lecturas que no se pudieron escribir", function=lambda: writer.failed)
+        registry.gauge("bridge_db_active_requests", "Solicitudes WebSocket usando la base de datos",
+                       function=lambda: self.admission.db_active)
+        registry.gauge("bridge_db_waiting_requests", "Solicitudes WebSocket esperando turno de base de datos",
+                       function=lambda: self.admission.db_waiting)
+        registry.gauge("bridge_spool_pending", "Lecturas en el spool pendientes de escribir en la base",
+                       function=lambda: spool.pending)
+        registry.gauge("bridge_spool_disk_bytes", "Bytes en disco ocupados por el spool", function=lambda: spool.disk_bytes)
+        registry.counter("bridge_spool_rejected_total", "Lecturas descartadas por spool lleno", function=lambda: spool.rejected)
+        registry.counter("bridge_stats_cache_hits_total", "Aciertos de la caché de estadísticas", function=lambda: stats_cache.hits)
+        registry.counter("bridge_stats_cache_misses_total", "Fallos de la caché de estadísticas", function=lambda: stats_cache.misses)
+
+    async def _process_http_request(self, path: str, request_headers: Any):
+        """Sirve las métricas en formato Prometheus por HTTP en el mismo puerto del WebSocket.
+
+        Durante el apagado, o con WS_MAX_CLIENTS clientes conectados,
+        rechaza las conexiones nuevas con 503.
+        """
+        if path.split("?", 1)[0] != self.metrics_path:
+            if self.draining:
+                return (
+                    HTTPStatus.SERVICE_UNAVAILABLE,
+                    [("Retry-After", str(max(1, round(self.reconnect_jitter / 1000))))],
+                    b"Servicio reiniciando\n"
+                )
+            if len(self.broadcaster.sessions) >= self.admission.max_clients:
+                REJECTED_CLIENTS.inc()
+                return (HTTPStatus.SERVICE_UNAVAILABLE, [("Retry-After", "5")], b"Demasiados clientes\n")
+            return None
+        return (
+            HTTPStatus.OK,
+            [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")],
+            registry.render().encode()
+        )
+
+    @handlers.event("getMetrics")
+    async def _get_metrics(self, websocket: websockets.WebSocketServerProtocol, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Retorna las métricas de este proceso como JSON."""
+        return {
+            'success': True,
+            'event': 'getMetrics',
+            'metrics': registry.snapshot()
+        }
+
+    def _on_bus_message(self, kind: int, topic: str, body: bytes):
+        """Procesa una trama recibida de otro nodo del clúster."""
         try:
-            while not self.message_queue.empty():
-                message = self.message_queue.get_nowait()
-                asyncio.create_task(self._broadcast_message(message))
+            if kind == MESSAGE:
+                text = body.decode()
+                backend = self.frame_encoder.backend
+                self.message_queue.put(Frame(topic, backend.loads(text)["parsedData"], text, backend))
+            elif kind == FLUSH:
+                # Lote escrito por otro nodo: invalidar caché y actualizar estadísticas en vivo
+                rows = [(value, datetime.fromisoformat(fecha)) for value, fecha in json.loads(body)]
+                writer.notify(STATS_MODELS[topic], topic, rows, skip=self._share_flush)
+            elif kind == STATS:
+                self.cluster_stats[topic] = json.loads(body)
         except Exception as e:
-            logger.error(f"Error procesando cola de mensajes: {e}")
+            logger.error(f"Error procesando trama del bus: {e}")
 
-    async def _broadcast_message(self, message: str):
-        """Envía un mensaje a todos los clientes WebSocket conectados."""
-        if not self.connected_clients:
-            return
-            
-        disconnected_clients = set()
-        for client in self.connected_clients:
+    def _share_flush(self, model: Any, fieldname: str, rows: List[Any]):
+        """Listener del escritor diferido: avisa a los demás nodos de cada lote escrito."""
+        if self.bus is not None:
+            body = json.dumps([[value, fecha.isoformat()] for value, fecha in rows]).encode()
+            self.bus.publish(FLUSH, fieldname, body)
+
+    def _node_stats(self) -> Dict[str, Any]:
+        """Contadores de este proceso."""
+        return {
+            'role': self.role,
+            'pid': os.getpid(),
+            'timestamp': time.time(),
+            'broadcast': self.broadcaster.stats(),
+            'ingest': self.message_queue.stats(),
+            'writer': writer.stats(),
+            'spool': spool.stats(),
+            'admission': self.admission.stats(),
+            'bus': self.bus.stats() if self.bus is not None else {}
+        }
+
+    async def _share_stats(self):
+        """Publica periódicamente los contadores de este nodo en el bus."""
+        while True:
+            await asyncio.sleep(self.stats_interval)
             try:
-                await client.send(message)
-            except websockets.exceptions.ConnectionClosed:
-                disconnected_clients.add(client)
+                self.bus.publish(STATS, self.node_id, json.dumps(self._node_stats()).encode())
             except Exception as e:
-                logger.error(f"Error enviando mensaje a cliente: {e}")
-                disconnected_clients.add(client)
-                
-        # Eliminar clientes desconectados
-        self.connected_clients -= disconnected_clients
+                logger.error(f"Error publicando contadores del nodo: {e}")
+
+    @handlers.event("getClusterStats")
+    async def _get_cluster_stats(self, websocket: websockets.WebSocketServerProtocol, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Contadores de cada nodo activo y su suma."""
+        expired = time.time() - 3 * self.stats_interval
+        nodes = {
+            node: stats for node, stats in self.cluster_stats.items()
+            if stats.get('timestamp', 0) >= expired
+        }
+        nodes[self.node_id] = self._node_stats()
+        return {
+            'success': True,
+            'event': 'getClusterStats',
+            'nodes': nodes,
+            'total': aggregate_stats(nodes.values())
+        }
 
     async def handle_websocket(self, websocket: websockets.WebSocketServerProtocol, path: str):
         """Maneja las conexiones WebSocket entrantes."""
-        self.connected_clients.add(websocket)
+        # process_request ya filtra, pero los handshakes concurrentes pasan juntos ese control:
+        # aquí el conteo y el registro ocurren sin ceder el loop
+        if len(self.broadcaster.sessions) >= self.admission.max_clients:
+            REJECTED_CLIENTS.inc()
+            await websocket.close(TRY_AGAIN_CLOSE_CODE, "Demasiados clientes")
+            return
+        self.broadcaster.register(websocket, negotiate_format(path))
         logger.info("Nuevo cliente WebSocket conectado")
+
+        # Las solicitudes se atienden en paralelo; al llegar al límite se deja de leer el socket
+        inflight = asyncio.Semaphore(self.max_inflight)
+        tasks: Set[asyncio.Task] = set()
+        limits = self.admission.client()
+
+        def finished(task: asyncio.Task):
+            tasks.discard(task)
+            inflight.release()
         
         try:
+            # Historial reciente pedido en la URL de conexión
+            replay = replay_request(path)
+            if replay is not None:
+                await websocket.send(json.dumps(self._recent_readings(replay)))
+
             async for message in websocket:
-                await self._process_websocket_message(websocket, message)
+                await inflight.acquire()
+                task = asyncio.create_task(self._process_websocket_message(websocket, message, limits))
+                tasks.add(task)
+                task.add_done_callback(finished)
         except websockets.exceptions.ConnectionClosed:
             logger.info("Cliente WebSocket desconectado")
         except Exception as e:
             logger.error(f"Error en manejo de WebSocket: {e}")
         finally:
-            self.connected_clients.remove(websocket)
+            for task in list(tasks):
+                task.cancel()
+            self.broadcaster.unregister(websocket)
 
-    async def _process_websocket_message(self, websocket: websockets.WebSocketServerProtocol, message: str):
-        """Procesa los mensajes recibidos por WebSocket."""
+    async def _process_websocket_message(self, websocket: websockets.WebSocketServerProtocol, message: str, limits: ClientLimits):
+        """Procesa un mensaje recibido por WebSocket y envía la respuesta de su evento.
+
+        Si el mensaje trae 'requestId' se repite en la respuesta, y los
+        errores también se responden para que el cliente pueda correlacionarlos.
+        Las solicitudes por encima de los límites de tasa o con la base
+        saturada se responden de inmediato con 'retryAfterMs'.
+        """
         try:
             parsed_data = json.loads(message)
-            logger.info(f"Mensaje recibido: {parsed_data}")
-            
-            event_handlers = {
-                "getBPMRecords": lambda: getBPMRecords(parsed_data.get("tiempo"), parsed_data),
-                "getTempRecords": lambda: getTempRecords(parsed_data.get("tiempo"), parsed_data),
-                "insertBPMRecords": lambda: insertBpm(parsed_data),
-                "insertTempRecords": lambda: insertTemp(parsed_data)
-            }
-            
-            event = parsed_data.get("event")
-            if event in event_handlers:
-                response = await event_handlers[event]()
-                logger.info("mensaje enviado.\n" + str(response))
-                await websocket.send(json.dumps(response))
-            else:
-                logger.warning(f"Evento desconocido: {event}")
-                
         except json.JSONDecodeError:
             logger.error("Error decodificando JSON")
-        except Exception as e:
-            logger.error(f"Error procesando mensaje: {e}")
+            return
+        if not isinstance(parsed_data, dict):
+            logger.error("El mensaje no es un objeto JSON")
+            return
+
+        log_payload("Mensaje recibido:", lambda: parsed_data)
+        event = parsed_data.get("event")
+        request_id = parsed_data.get("requestId")
+        handler = handlers.get(event)
+
+        try:
+            limits.check(handler.name, handler.db) if handler is not None else limits.check(None)
+        except Overloaded as e:
+            await self._reply(websocket, event, request_id, self._overloaded_response(event, e))
+            if limits.abusive:
+                logger.warning(f"Cliente desconectado por exceder los límites de tasa ({limits.rejected_streak} rechazos seguidos)")
+                await websocket.close(code=POLICY_CLOSE_CODE, reason="Demasiadas solicitudes")
+            return
+
+        if handler is None:
+            logger.warning(f"Evento desconocido: {event}")
+            if request_id is None:
+                return
+            response = {'success': False, 'event': event, 'message': "Evento desconocido"}
+        else:
+            try:
+                with HANDLER_LATENCY.time(event=event):
+                    response = await asyncio.wait_for(self._call_handler(handler, websocket, parsed_data), handler.timeout)
+            except Overloaded as e:
+                response = self._overloaded_response(event, e)
+            except asyncio.TimeoutError:
+                logger.warning(f"Tiempo de espera agotado en {event} ({handler.timeout}s)")
+                response = {'success': False, 'event': event, 'message': "Tiempo de espera agotado"}
+            except Exception as e:
+                logger.error(f"Error procesando {event}: {e}")
+                if request_id is None:
+                    return
+                response = {'success': False, 'event': event, 'message': "Error interno"}
+
+        await self._reply(websocket, event, request_id, response)
+
+    async def _reply(self, websocket: websockets.WebSocketServerProtocol, event: Any, request_id: Any, response: Any):
+        if request_id is not None:
+            # Copia: las respuestas en caché son compartidas y no deben modificarse
+            response = {**(response or {}), 'requestId': request_id}
+
+        log_payload(f"Respuesta a {event}:", lambda: response)
+        try:
+            await websocket.send(json.dumps(response))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+    @staticmethod
+    def _overloaded_response(event: Any, error: Overloaded) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'event': event,
+            'message': str(error),
+            'retryAfterMs': math.ceil(error.retry_after * 1000)
+        }
+
+    async def _call_handler(self, handler: Any, websocket: websockets.WebSocketServerProtocol, parsed_data: Dict[str, Any]) -> Any:
+        if not handler.db:
+            return await handler.function(self, websocket, parsed_data)
+
+        await self.db_ready.wait()
+        # Cupo global de consultas: un cliente no puede acaparar el pool de conexiones
+        await self.admission.acquire_db()
+        try:
+            return await handler.function(self, websocket, parsed_data)
+        finally:
+            self.admission.release_db()
+
+    @staticmethod
+    def _requested_topics(parsed_data: Dict[str, Any]) -> List[str]:
+        """Extrae los filtros de tópico ('topic' o 'topics') de un mensaje."""
+        topics = parsed_data.get("topics", parsed_data.get("topic"))
+        if isinstance(topics, str):
+            topics = [topics]
+        return topics if isinstance(topics, list) else []
+
+    @handlers.event("subscribe")
+    async def _subscribe(self, websocket: websockets.WebSocketServerProtocol, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Suscribe al cliente a los tópicos indicados (admite comodines '+' y '#')."""
+        topics = self._requested_topics(parsed_data)
+        invalid = [topic for topic in topics if not TopicTrie.is_valid(topic)]
+        if not topics or invalid:
+            return {
+                'success': False,
+                'event': 'subscribe',
+                'message': f"Tópicos inválidos: {invalid or topics}"
+            }
+
+        return {
+            'success': True,
+            'event': 'subscribe',
+            'topics': self.broadcaster.subscribe(websocket, topics)
+        }
+
+    @handlers.event("unsubscribe")
+    async def _unsubscribe(self, websocket: websockets.WebSocketServerProtocol, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Cancela la suscripción del cliente a los tópicos indicados."""
+        topics = self._requested_topics(parsed_data)
+        if not topics:
+            return {
+                'success': False,
+                'event': 'unsubscribe',
+                'message': "No se indicaron tópicos"
+            }
+
+        return {
+            'success': True,
+            'event': 'unsubscribe',
+            'topics': self.broadcaster.unsubscribe(websocket, topics)
+        }
+
+    def _recent_readings(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Arma la respuesta de getRecentReadings con las lecturas en memoria."""
+        return {
+            'success': True,
+            'event': 'getRecentReadings',
+            'readings': self.history.recent(request.get('topics'), request.get('samples'), request.get('seconds'))
+        }
+
+    @handlers.event("getRecentReadings")
+    async def _get_recent_readings(self, websocket: websockets.WebSocketServerProtocol, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Retorna las últimas N lecturas ('samples') o las de los últimos N segundos ('seconds')."""
+        try:
+            request = {
+                'topics': self._requested_topics(parsed_data) or None,
+                'samples': int(parsed_data['samples']) if parsed_data.get('samples') is not None else None,
+                'seconds': float(parsed_data['seconds']) if parsed_data.get('seconds') is not None else None
+            }
+        except (TypeError, ValueError):
+            return {
+                'success': False,
+                'event': 'getRecentReadings',
+                'message': "samples o seconds inválido"
+            }
+
+        return self._recent_readings(request)
+
+    @staticmethod
+    def _requested_stats(parsed_data: Dict[str, Any]):
+        """Valida el tipo ('bpm'/'temperatura') y el tiempo de una suscripción a estadísticas."""
+        tipo = parsed_data.get("tipo")
+        tiempo = parsed_data.get("tiempo")
+        if tipo not in STATS_MODELS or tiempo not in PERIODS:
+            return None
+        return tipo, tiempo
+
+    @handlers.event("subscribeStats", db=True)
+    async def _subscribe_stats(self, websocket: websockets.WebSocketServerProtocol, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Suscribe al cliente a las actualizaciones de una estadística y retorna su valor actual."""
+        requested = self._requested_stats(parsed_data)
+        if requested is None:
+            return {
+                'success': False,
+                'event': 'subscribeStats',
+                'message': "Tipo o tiempo inválido"
+            }
+
+        tipo, tiempo = requested
+        topic = stats_topic(tipo, tiempo)
+        self.broadcaster.subscribe(websocket, [topic], replace_defaults=False)
+        return {
+            **await getLiveStats(tipo, tiempo),
+            'event': 'subscribeStats',
+            'topic': topic
+        }
+
+    @handlers.event("unsubscribeStats")
+    async def _unsubscribe_stats(self, websocket: websockets.WebSocketServerProtocol, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Cancela la suscripción del cliente a una estadística."""
+        requested = self._requested_stats(parsed_data)
+        if requested is None:
+            return {
+                'success': False,
+                'event': 'unsubscribeStats',
+                'message': "Tipo o tiempo inválido"
+            }
+
+        topic = stats_topic(*requested)
+        return {
+            'success': True,
+            'event': 'unsubscribeStats',
+            'topics': self.broadcaster.unsubscribe(websocket, [topic])
+        }
 
     async def start(self):
-        """Inicia el servicio WebSocket-MQTT."""
+        """Inicia el servicio y lo mantiene hasta que se pida detenerlo.
+
+        La base de datos, la conexión MQTT, el bus del clúster y el listener
+        WebSocket se inician a la vez; los eventos que usan la base esperan
+        a que conecte.
+        """
         try:
+            started = time.perf_counter()
             # Guardar referencia al event loop
             self.event_loop = asyncio.get_running_loop()
-            
-            # Conectar a la base de datos
-            await connectToDatabase()
-            logger.info("Conectado a la base de datos")
-            
-            # Conectar cliente MQTT
-            self.mqtt_client.connect(
+            self.message_queue.attach(self.event_loop)
+
+            # El spool absorbe lecturas desde el primer mensaje MQTT, aunque la base aún no responda
+            if self.use_spool:
+                spool.open()
+
+            # Antes de crear las tareas de arranque, para que las del listener vean la base
+            activateDatabaseContext()
+            startup = [asyncio.create_task(self._start_bus()), asyncio.create_task(self._start_mqtt())]
+            if self.role != INGEST:
+                startup.append(asyncio.create_task(self._start_server()))
+
+            try:
+                await connectToDatabase()
+                logger.info("Conectado a la base de datos")
+                self.db_ready.set()
+                if self.use_spool:
+                    self.spool_task = asyncio.create_task(spool.drain(drain_spool))
+
+                await asyncio.gather(*startup)
+            except BaseException:
+                for task in startup:
+                    task.cancel()
+                raise
+
+            if self.role == INGEST:
+                logger.info(f"Nodo de ingesta {self.node_id} iniciado en {time.perf_counter() - started:.2f}s")
+            else:
+                logger.info(f"Servicio iniciado en {time.perf_counter() - started:.2f}s")
+            await self._stop_requested.wait()
+
+        except Exception as e:
+            logger.error(f"Error iniciando el servicio: {e}")
+            raise
+
+    async def _start_bus(self):
+        """Bus del clúster: el nodo de ingesta es el concentrador."""
+        if self.role == INGEST:
+            self.bus = BusHub(self._on_bus_message)
+            await self.bus.start()
+        elif self.role == WORKER:
+            self.bus = BusClient(self._on_bus_message)
+            self.bus_task = asyncio.create_task(self.bus.run())
+        if self.bus is not None:
+            self.stats_task = asyncio.create_task(self._share_stats())
+
+    async def _start_mqtt(self):
+        """Conecta el cliente MQTT (los workers reciben los mensajes por el bus)."""
+        if self.mqtt_client is not None:
+            # connect() resuelve el nombre y abre el socket de forma bloqueante: va en un hilo
+            await self.event_loop.run_in_executor(None, functools.partial(
+                self.mqtt_client.connect,
                 host=os.getenv("MQTT_BROKER", "localhost"),
                 port=int(os.getenv("MQTT_PORT", 1883)),
                 keepalive=60
-            )
+            ))
             self.mqtt_client.loop_start()
-            
-            # Iniciar servidor WebSocket
-            ws_host = os.getenv("WEBSOCKET_HOST", "localhost")
-            ws_port = int(os.getenv("WEBSOCKET_PORT", 8765))
-            
-            async with websockets.serve(self.handle_websocket, ws_host, ws_port):
-                logger.info(f"Servidor WebSocket iniciado en ws://{ws_host}:{ws_port}")
-                await asyncio.Future()  # Mantener el servicio ejecutándose
-                
-        except Exception as e:
-            logger.error(f"Error iniciando el servicio: {e}")
-            raise
-        
+        elif self.role != WORKER:
+            source = AsyncMQTTSource(MQTT_TOPICS, self._ingest)
+            self.mqtt_task = asyncio.create_task(source.run())
+
+    async def _start_server(self):
+        """Abre el listener WebSocket."""
+        ws_host = os.getenv("WEBSOCKET_HOST", "localhost")
+        ws_port = int(os.getenv("WEBSOCKET_PORT", 8765))
+
+        # SO_REUSEPORT: varios workers comparten el puerto y el kernel reparte las conexiones
+        self.server = await websockets.serve(
+            self.handle_websocket,
+            ws_host,
+            ws_port,
+            reuse_port=self.role == WORKER,
+            process_request=self._process_http_request,
+            max_size=self.max_message_size,
+            max_queue=self.max_incoming_queue
+        )
+        logger.info(f"Servidor WebSocket iniciado en ws://{ws_host}:{ws_port}")
+
+    def request_stop(self):
+        """Pide detener el servicio (lo llaman los manejadores de SIGTERM/SIGINT)."""
+        self._stop_requested.set()
+
+    def _restart_notice(self) -> str:
+        """Aviso previo al cierre, con un tiempo de reconexión distinto para cada cliente."""
+        return json.dumps({
+            'event': 'serverRestart',
+            'reconnectInMs': round(random.uniform(0, self.reconnect_jitter))
+        })
+
     async def stop(self):
-        """Detiene el servicio."""
+        """Detiene el servicio sin perder lecturas ni mensajes ya recibidos.
+
+        Deja de aceptar clientes y de leer MQTT, entrega lo que quedó en el
+        buffer de ingesta y en el batcher, y cierra los sockets en paralelo
+        (código 1012) después de enviar lo encolado y un aviso de
+        reconexión. Luego escribe las lecturas pendientes; lo que siga en el
+        spool se retoma al reiniciar. Todo dentro de SHUTDOWN_TIMEOUT segundos.
+        """
+        if self.stopped:
+            return
+        self.stopped = True
+        self.draining = True
+        self._stop_requested.set()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.shutdown_timeout
+
+        def remaining() -> float:
+            return max(deadline - loop.time(), 0.1)
+
         try:
-            self.mqtt_client.loop_stop()
-            self.mqtt_client.disconnect()
-            
-            # Cerrar todas las conexiones WebSocket
-            for client in self.connected_clients:
-                await client.close()
-            self.connected_clients.clear()
-            
+            # No aceptar más conexiones (las que lleguen en medio reciben 503)
+            if self.server is not None:
+                self.server.server.close()
+
+            # Cortar la entrada MQTT y entregar lo que ya llegó
+            if self.mqtt_client is not None:
+                self.mqtt_client.disconnect()
+                await loop.run_in_executor(None, self.mqtt_client.loop_stop)
+            if self.mqtt_task is not None:
+                self.mqtt_task.cancel()
+            self.message_queue.flush()
+            self.batcher.flush()
+
+            # Vaciar las colas de los clientes y cerrar todos los sockets a la vez
+            await self.broadcaster.shutdown(
+                RESTART_CLOSE_CODE,
+                "Reinicio del servicio",
+                self._restart_notice,
+                timeout=remaining()
+            )
+            if self.server is not None:
+                self.server.close()
+                await asyncio.wait_for(self.server.wait_closed(), remaining())
+
+            for task in (self.bus_task, self.stats_task, self.spool_task):
+                if task is not None:
+                    task.cancel()
+            if isinstance(self.bus, BusHub):
+                await self.bus.close()
+
+            # Escribir las lecturas que aún estén en memoria; lo que quede en el spool se retoma al reiniciar
+            await asyncio.wait_for(writer.flush(), remaining())
+
         except Exception as e:
             logger.error(f"Error deteniendo el servicio: {e}")
+        finally:
+            spool.close()
+            await closeDatabase()
+            stats_engine.shutdown()
 
 async def main():
     """Función principal para iniciar el servicio."""
+    configure_logging()
     bridge = WebSocketMQTTBridge()
+
+    # SIGTERM (despliegues) y SIGINT inician un apagado ordenado
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, bridge.request_stop)
+        except NotImplementedError:
+            pass
+
     try:
         await bridge.start()
-    except KeyboardInterrupt:
-        await bridge.stop()
     except Exception as e:
         logger.error(f"Error en main: {e}")
+    finally:
         await bridge.stop()
 
-if __name__ == "__main__":
+def run_node(role: str, node: str):
+    """Arranca un nodo del clúster en el proceso actual (lo usa run_cluster)."""
+    os.environ["CLUSTER_ROLE"] = role
+    os.environ["CLUSTER_NODE_ID"] = node
     try:
         asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    try:
+        # WORKERS > 1: un nodo de ingesta en este proceso y N workers que comparten el puerto
+        workers = int(os.getenv("WORKERS", 1))
+        if workers > 1:
+            run_cluster(run_node, workers)
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("Servicio detenido por el usuario")
     except Exception as e:
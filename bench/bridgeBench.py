@@ -0,0 +1,328 @@
+"""Benchmark del bridge: difusión MQTT → WebSocket y consultas de estadísticas.
+
+Levanta en el mismo proceso un broker MQTT de prueba (tools.fakeBroker) y
+el bridge con una base de datos SQLite en memoria; los clientes WebSocket
+corren en un proceso aparte para no mezclar su memoria con la del bridge.
+
+    python -m bench.bridgeBench --clients 1000 --messages 2000 --output bench.json
+    python -m bench.bridgeBench --compare bench.json --tolerance 0.25
+
+Con --compare el proceso termina con código 1 si alguna métrica empeoró
+más que la tolerancia respecto a los resultados guardados.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import statistics
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+PERIODS = ("dia", "semana", "mes")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _rss_bytes() -> int:
+    """Memoria residente actual del proceso."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _latency_summary(samples: List[float]) -> Dict[str, Optional[float]]:
+    """p50/p99/máximo en milisegundos."""
+    if len(samples) < 2:
+        value = samples[0] * 1000 if samples else None
+        return {"p50": value, "p99": value, "max": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p99": cuts[98] * 1000, "max": max(samples) * 1000}
+
+
+# --- Clientes WebSocket (proceso aparte) -----------------------------------
+
+async def _clients_main(url: str, clients: int, messages: int, timeout: float, ready, results):
+    import websockets
+
+    connections = []
+    for start in range(0, clients, 200):
+        connections += await asyncio.gather(*(
+            websockets.connect(url, max_queue=None) for _ in range(start, min(start + 200, clients))
+        ))
+    ready.put(len(connections))
+
+    latencies = array("d")
+    received = 0
+    first = last = None
+
+    async def consume(connection):
+        nonlocal received, first, last
+        count = 0
+        while count < messages:
+            message = await connection.recv()
+            now = time.time()
+            data = json.loads(message)
+            parsed = data.get("parsedData") if isinstance(data, dict) else None
+            if not isinstance(parsed, dict) or "ts" not in parsed:
+                continue
+            latencies.append(now - parsed["ts"])
+            count += 1
+            received += 1
+            first = now if first is None else first
+            last = now
+
+    try:
+        await asyncio.wait_for(asyncio.gather(*(consume(connection) for connection in connections)), timeout)
+    except asyncio.TimeoutError:
+        pass
+
+    for connection in connections:
+        await connection.close()
+
+    results.put({
+        "received": received,
+        "first": first,
+        "last": last,
+        "latency": _latency_summary(list(latencies))
+    })
+
+
+def run_clients(url: str, clients: int, messages: int, timeout: float, ready, results):
+    asyncio.run(_clients_main(url, clients, messages, timeout, ready, results))
+
+
+# --- Difusión ----------------------------------------------------------------
+
+async def bench_fanout(clients: int, messages: int, rate: float, timeout: float) -> Dict[str, Any]:
+    """Publica `messages` lecturas y mide lo que reciben `clients` clientes WebSocket."""
+    from app import WebSocketMQTTBridge
+    from tools.fakeBroker import FakeBroker
+
+    broker = FakeBroker("127.0.0.1", 0)
+    await broker.start()
+    ws_port = _free_port()
+    os.environ.update({
+        "MQTT_BROKER": "127.0.0.1",
+        "MQTT_PORT": str(broker.port),
+        "WEBSOCKET_HOST": "127.0.0.1",
+        "WEBSOCKET_PORT": str(ws_port)
+    })
+
+    bridge = WebSocketMQTTBridge()
+    server = asyncio.create_task(bridge.start())
+    await _wait_for_port(ws_port)
+    while not broker.clients:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.2)  # SUBSCRIBE del bridge
+
+    rss_before = _rss_bytes()
+    context = multiprocessing.get_context("spawn")
+    ready, results = context.Queue(), context.Queue()
+    process = context.Process(
+        target=run_clients,
+        args=(f"ws://127.0.0.1:{ws_port}", clients, messages, timeout, ready, results)
+    )
+    process.start()
+    connected = await asyncio.get_running_loop().run_in_executor(None, ready.get)
+    while len(bridge.broadcaster.sessions) < connected:
+        await asyncio.sleep(0.05)
+    rss_after = _rss_bytes()
+
+    # Publicar las lecturas (a `rate` por segundo o tan rápido como se pueda)
+    interval = 1 / rate if rate else 0
+    started = time.time()
+    for sequence in range(messages):
+        broker.publish("sensor/bpm", json.dumps({"bpm": random.randint(55, 120), "seq": sequence, "ts": time.time()}).encode())
+        await asyncio.sleep(interval)
+    published = time.time()
+
+    summary = await asyncio.get_running_loop().run_in_executor(None, results.get)
+    process.join(timeout=10)
+
+    server.cancel()
+    await bridge.stop()
+    await broker.close()
+
+    duration = (summary["last"] or published) - started
+    return {
+        "clients": connected,
+        "messages": messages,
+        "delivered": summary["received"],
+        "expected": connected * messages,
+        "ingestPerSecond": messages / max(published - started, 1e-9),
+        "deliveredPerSecond": summary["received"] / max(duration, 1e-9),
+        "latencyMs": summary["latency"],
+        "bytesPerConnection": (rss_after - rss_before) / max(connected, 1),
+        "broadcast": bridge.broadcaster.stats()
+    }
+
+
+async def _wait_for_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+    raise TimeoutError(f"El puerto {port} no abrió")
+
+
+# --- Estadísticas ------------------------------------------------------------
+
+async def bench_stats(size: int, repeat: int) -> Dict[str, Any]:
+    """Inserta `size` lecturas en SQLite en memoria y mide getBPMRecords e insertBpm."""
+    from tortoise import Tortoise
+    from database.conn import closeDatabase, connectToDatabase
+    from models.BPM import BPMModel
+    from controllers.statisticsController import getBPMRecords, insertBpm
+    from services.statsCache import stats_cache
+    from services.writeBehind import writer
+
+    await connectToDatabase()
+    await Tortoise.generate_schemas()
+    stats_cache.clear()
+
+    # Lecturas repartidas en los últimos 60 días
+    now = datetime.now()
+    step = timedelta(days=60) / size
+    started = time.perf_counter()
+    for index in range(size):
+        writer.submit(BPMModel, "bpm", random.uniform(55, 120), now - step * index)
+        if writer.pending >= writer.max_pending // 2:
+            await writer.flush()
+    await writer.flush()
+    insert_seconds = time.perf_counter() - started
+
+    result: Dict[str, Any] = {
+        "rows": size,
+        "bulkInsertPerSecond": size / max(insert_seconds, 1e-9),
+        "queries": {}
+    }
+
+    for tiempo in PERIODS:
+        cold, warm = [], []
+        for _ in range(repeat):
+            stats_cache.clear()
+            started = time.perf_counter()
+            await getBPMRecords(tiempo, {})
+            cold.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            await getBPMRecords(tiempo, {})
+            warm.append(time.perf_counter() - started)
+        result["queries"][tiempo] = {"uncachedMs": _latency_summary(cold), "cachedMs": _latency_summary(warm)}
+
+    inserts = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await insertBpm({"body": {"valor": 70}})
+        inserts.append(time.perf_counter() - started)
+    result["insertBpmMs"] = _latency_summary(inserts)
+
+    await closeDatabase()
+    return result
+
+
+# --- Comparación -------------------------------------------------------------
+
+def _tracked(results: Dict[str, Any]) -> Dict[str, tuple]:
+    """Métricas vigiladas: nombre → (valor, True si mayor es mejor)."""
+    tracked = {}
+    fanout = results.get("fanout")
+    if fanout:
+        tracked["fanout.deliveredPerSecond"] = (fanout["deliveredPerSecond"], True)
+        tracked["fanout.latencyMs.p99"] = (fanout["latencyMs"]["p99"], False)
+        tracked["fanout.bytesPerConnection"] = (fanout["bytesPerConnection"], False)
+    for size, stats in results.get("stats", {}).items():
+        for tiempo, query in stats["queries"].items():
+            tracked[f"stats.{size}.{tiempo}.uncachedMs.p99"] = (query["uncachedMs"]["p99"], False)
+    return tracked
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Retorna las métricas que empeoraron más que la tolerancia."""
+    regressions = []
+    previous = _tracked(baseline)
+    for name, (value, higher_is_better) in _tracked(current).items():
+        if name not in previous or value is None or previous[name][0] in (None, 0):
+            continue
+        before = previous[name][0]
+        change = (before - value) / before if higher_is_better else (value - before) / before
+        if change > tolerance:
+            regressions.append(f"{name}: {before:.4g} → {value:.4g} ({change:+.0%})")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark del bridge WebSocket-MQTT")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=1000, help="Mensajes MQTT publicados")
+    parser.add_argument("--rate", type=float, default=0, help="Mensajes por segundo (0 = sin pausa)")
+    parser.add_argument("--timeout", type=float, default=120, help="Tiempo máximo de recepción en segundos")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Lecturas en la base para el benchmark de estadísticas")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones de cada consulta")
+    parser.add_argument("--skip-fanout", action="store_true")
+    parser.add_argument("--skip-stats", action="store_true")
+    parser.add_argument("--output", help="Archivo JSON de resultados")
+    parser.add_argument("--compare", help="Resultados previos contra los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento relativo permitido")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+    os.environ["DB_URL"] = "sqlite://:memory:"
+    os.environ.setdefault("DB_CONNECT_RETRIES", "1")
+
+    results: Dict[str, Any] = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": vars(args)
+    }
+
+    if not args.skip_stats:
+        results["stats"] = {}
+        for size in (int(value) for value in args.sizes.split(",") if value):
+            results["stats"][str(size)] = await bench_stats(size, args.repeat)
+            print(json.dumps({"stats": {size: results["stats"][str(size)]["queries"]}}), flush=True)
+
+    if not args.skip_fanout:
+        results["fanout"] = await bench_fanout(args.clients, args.messages, args.rate, args.timeout)
+        print(json.dumps({"fanout": results["fanout"]}), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare(results, json.load(baseline), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESIÓN {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
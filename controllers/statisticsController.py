@@ -1,10 +1,48 @@
-import datetime
+import asyncio
+import os
+from datetime import datetime, timedelta
 from typing import Dict, Any
+from loguru import logger
 from tortoise.models import Model
 from models.BPM import BPMModel
 from models.TempModel import TempModel
-from datetime import datetime, timedelta
-from tortoise.queryset import QuerySet
+from services.readings import extract_value
+from database.queries import SERIES_AGGREGATES, history_series, period_aggregates, period_values, to_date
+from database.rollups import next_start, previous_start, rollup_aggregates, rollup_series
+from services.writeBehind import writer
+from services.spool import Spool
+from services.statsCache import stats_cache
+from services.statsEngine import stats_engine
+from services.liveStats import LiveStats
+from services.logConfig import log_payload
+from services.metrics import DB_QUERY_LATENCY, timed
+
+# Tópicos MQTT de sensores que se pueden persistir automáticamente
+SENSOR_MODELS = {
+    "sensor/bpm": (BPMModel, "bpm"),
+    "sensor/temperatura": (TempModel, "temperatura")
+}
+
+# Código de cada modelo en el spool de lecturas (queda escrito en disco: no reasignar)
+SPOOL_KINDS = {
+    1: (BPMModel, "bpm"),
+    2: (TempModel, "temperatura")
+}
+SPOOL_CODES = {model: kind for kind, (model, _) in SPOOL_KINDS.items()}
+
+# Modelo de cada tipo de estadística
+STATS_MODELS = {
+    "bpm": BPMModel,
+    "temperatura": TempModel
+}
+
+PERIODS = ("dia", "semana", "mes")
+
+# Cada lote escrito invalida solo los periodos en caché que lo incluyen
+writer.add_flush_listener(stats_cache.on_flush)
+
+# Lecturas MQTT en disco a la espera de la base; lo abre el bridge al iniciar
+spool = Spool()
 
 async def insertBpm(message_data):
     return await insert_record(message_data, BPMModel, "bpm")
@@ -13,28 +51,74 @@ async def insertTemp(message_data):
     return await insert_record(message_data, TempModel, "temperatura")
 
 async def getBPMRecords(time : str, message_data):
-    if time == "dia":
-        return await search_per_day(message_data, BPMModel, "bpm")
-    
-    if time == "semana":
-        return await search_per_week(message_data, BPMModel, "bpm")
-    
-    if time == "mes":
-        return await search_per_month(message_data, BPMModel, "bpm")
+    if time not in PERIODS:
+        return None
+    return await stats_cache.get_or_load(
+        (BPMModel, time),
+        lambda: search_records(time, message_data, BPMModel, "bpm")
+    )
         
 async def getTempRecords(time : str, message_data):
+    if time not in PERIODS:
+        return None
+    return await stats_cache.get_or_load(
+        (TempModel, time),
+        lambda: search_records(time, message_data, TempModel, "temperatura")
+    )
+
+async def getCacheStats():
+    return {
+        'success': True,
+        'event': 'getCacheStats',
+        **stats_cache.stats()
+    }
+
+async def getLiveStats(tipo: str, tiempo: str):
+    """Activa la estadística en vivo y retorna su valor actual."""
+    return await live_stats.activate(STATS_MODELS[tipo], tipo, tiempo)
+
+async def search_records(time: str, message_data, type_model: Model, fieldname: str):
     if time == "dia":
-        return await search_per_day(message_data, TempModel, "temperatura")
-    
-    if time == "semana":
-        return await search_per_week(message_data, TempModel, "temperatura")
-    
-    if time == "mes":
-        return await search_per_month(message_data, TempModel, "temperatura")
+        response = await search_per_day(message_data, type_model, fieldname)
+    elif time == "semana":
+        response = await search_per_week(message_data, type_model, fieldname)
+    elif time == "mes":
+        response = await search_per_month(message_data, type_model, fieldname)
+    else:
+        return None
+
+    if STATS_DETAIL and response.get('success') and response['totalActual'] + response['totalAnterior'] <= STATS_DETAIL_MAX_ROWS:
+        response.update(await period_detail(type_model, fieldname, time, response['inicioActual']))
+    return response
+
+def persistSensorReading(topic: str, data: Any) -> bool:
+    """Encola una lectura MQTT de sensor para escritura diferida, sin esperar."""
+    type_model, fieldname = SENSOR_MODELS[topic]
+    valor = extract_value(data, fieldname)
+    if valor is None:
+        return False
+
+    dispositivo = str(data['dispositivo']) if isinstance(data, dict) and data.get('dispositivo') else None
+    if spool.is_open:
+        # La lectura queda en disco y drain_spool la escribe en la base en lotes grandes
+        return spool.append(SPOOL_CODES[type_model], valor, datetime.now(), dispositivo)
+
+    writer.submit(type_model, fieldname, valor, extra={'dispositivo': dispositivo} if dispositivo else None)
+    return True
+
+async def drain_spool(readings):
+    """Escribe en la base un lote leído del spool, agrupado por modelo."""
+    batches = {}
+    for kind, valor, fecha, dispositivo in readings:
+        if kind in SPOOL_KINDS:
+            batches.setdefault(kind, []).append((valor, fecha, {'dispositivo': dispositivo} if dispositivo else {}))
+
+    # Una sola transacción: si falla, el reintento del spool no duplica ningún modelo
+    await writer.write_batch([(*SPOOL_KINDS[kind], rows) for kind, rows in batches.items()])
 
 async def insert_record(message_data: Dict[str, Any], type_model: Model, fieldname: str) -> Dict[str, Any]:
     try:
-        print(message_data)
+        log_payload("Registro recibido:", lambda: message_data)
         valor = message_data.get('body').get('valor')
 
         if valor is None:
@@ -54,20 +138,12 @@ async def insert_record(message_data: Dict[str, Any], type_model: Model, fieldna
         # Obtener la fecha actual
         now = datetime.now()
         
-        # Crear un nuevo registro
-        new_record: Model = None
-        
-        if fieldname == "bpm":
-            new_record = type_model.create(bpm = valor, fecha = now)
-            
-        if fieldname == "temperatura":
-            new_record = type_model.create(temperatura = valor, fecha = now)
+        # Dispositivo que originó la lectura (opcional)
+        dispositivo = message_data.get('body').get('dispositivo')
+        extra = {'dispositivo': str(dispositivo)} if dispositivo else None
 
-        if not new_record:
-            return {
-                'success': False,
-                'message': "No se pudo guardar el nuevo registro"
-            }
+        # Se confirma solo cuando el lote que contiene el registro quedó escrito
+        await writer.write(type_model, fieldname, safe_valor, now, extra)
 
         return {
             'success': True,
@@ -81,70 +157,108 @@ async def insert_record(message_data: Dict[str, Any], type_model: Model, fieldna
         }
         
 
-from typing import Dict, Any
-from datetime import datetime, timedelta
-from tortoise.queryset import QuerySet
-
-def calculate_mean(records: QuerySet, value_field_name: str) -> float:
-    if not records:
-        return 0.0
-    
-    values = [getattr(record, value_field_name) for record in records]
-    return sum(values) / len(values)
-
-import calendar
-from typing import Dict, Any, List
-from datetime import datetime
-from tortoise import fields
-import locale
-
-def calculate_mean1(records: List[Any], value_field_name: str) -> float:
+# "rollups": leer las tablas de agregados; "raw": agregar las lecturas en cada consulta
+STATS_SOURCE = os.getenv("STATS_SOURCE", "rollups")
+
+# Nombres de los meses, sin depender del locale del proceso
+MONTH_NAMES = (
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
+)
+
+def month_label(fecha) -> str:
+    """Nombre del mes y año, p. ej. 'octubre 2026'."""
+    return f"{MONTH_NAMES[fecha.month - 1]} {fecha.year}"
+
+# Mediana, p95 y desviación estándar de ambos periodos. Leen todas las lecturas de
+# los dos periodos, por eso están desactivadas por defecto y se omiten si suman
+# más de STATS_DETAIL_MAX_ROWS
+STATS_DETAIL = os.getenv("STATS_DETAIL", "false").lower() in ("1", "true", "yes")
+STATS_DETAIL_MAX_ROWS = int(os.getenv("STATS_DETAIL_MAX_ROWS", 200000))
+
+async def fetch_aggregates(type_model: Any, value_field_name: str, tiempo: str) -> Dict[str, Any]:
     """
-    Calcula la media de los registros para un campo específico.
+    Obtiene los agregados de ambos periodos, de los rollups si existen.
     """
-    if not records:
-        return 0.0
-    
-    try:
-        values = [float(getattr(record, value_field_name)) for record in records]
-        return sum(values) / len(values)
-    except Exception as e:
-        print(f"Error en calculate_mean: {str(e)}")
-        return 0.0
+    if STATS_SOURCE == "rollups":
+        aggregates = await rollup_aggregates(type_model, tiempo)
+        if aggregates:
+            return aggregates
+    return await period_aggregates(type_model, value_field_name, tiempo)
 
+def period_stats(aggregates: Dict[str, Any], decimals: int = None) -> Dict[str, Any]:
+    """
+    Arma los campos de promedio, conteo, mínimo y máximo de ambos periodos.
+    """
+    actual = aggregates['actual']
+    anterior = aggregates['anterior']
+    prom_actual = actual['promedio']
+    prom_anterior = anterior['promedio']
+    if decimals is not None:
+        prom_actual = round(prom_actual, decimals)
+        prom_anterior = round(prom_anterior, decimals)
+
+    return {
+        'promActual': prom_actual,
+        'promAnterior': prom_anterior,
+        'totalActual': actual['total'],
+        'totalAnterior': anterior['total'],
+        'minActual': actual['minimo'],
+        'maxActual': actual['maximo'],
+        'minAnterior': anterior['minimo'],
+        'maxAnterior': anterior['maximo']
+    }
+
+@timed(DB_QUERY_LATENCY, function="period_detail")
+async def period_detail(type_model: Any, value_field_name: str, tiempo: str, inicio_actual: Any) -> Dict[str, Any]:
+    """
+    Calcula mediana, p95 y desviación estándar de ambos periodos.
+
+    Las lecturas se leen como arreglos de floats y el cálculo corre en el
+    pool de stats_engine, fuera del event loop.
+    """
+    try:
+        inicio_actual = to_date(inicio_actual)
+        inicio_anterior = previous_start(inicio_actual, tiempo)
+        valores_actual, valores_anterior = await asyncio.gather(
+            period_values(type_model, value_field_name, inicio_actual, next_start(inicio_actual, tiempo)),
+            period_values(type_model, value_field_name, inicio_anterior, inicio_actual)
+        )
+        actual, anterior = await asyncio.gather(
+            stats_engine.describe(valores_actual),
+            stats_engine.describe(valores_anterior)
+        )
+    except Exception as error:
+        logger.error(f"Error calculando el detalle de {value_field_name}/{tiempo}: {error}")
+        return {}
+
+    return {
+        'medianaActual': actual['mediana'],
+        'p95Actual': actual['p95'],
+        'desvActual': actual['desviacion'],
+        'medianaAnterior': anterior['mediana'],
+        'p95Anterior': anterior['p95'],
+        'desvAnterior': anterior['desviacion']
+    }
+
+@timed(DB_QUERY_LATENCY, function="search_per_month")
 async def search_per_month(message_data: Dict[str, Any], type_model: Any, value_field_name: str) -> Dict[str, Any]:
     try:
-        print(f"Buscando último registro...")
-        last_record = await type_model.filter().order_by('-fecha').first()
+        aggregates = await fetch_aggregates(type_model, value_field_name, 'mes')
 
-        if not last_record:
+        if not aggregates:
             return {
                 'success': False,
                 'message': "No se encontraron datos"
             }
 
-        print(f"Último registro encontrado: {last_record}")
-        fecha = last_record.fecha
-        print(f"Fecha extraída: {fecha}")
+        fecha = aggregates['ultima']
 
         last_year = fecha.year
         last_month = fecha.month
-        print(f"Año: {last_year}, Mes: {last_month}")
 
-        # Crear fechas de inicio y fin para el mes actual
+        # Fecha de inicio del mes actual
         current_month_start = datetime(last_year, last_month, 1).date()
-        if last_month == 12:
-            next_month = datetime(last_year + 1, 1, 1).date()
-        else:
-            next_month = datetime(last_year, last_month + 1, 1).date()
-
-        # Buscar registros del mes actual usando comparación de fechas
-        current_month_records = await type_model.filter(
-            fecha__gte=current_month_start,
-            fecha__lt=next_month
-        ).all()
-        
-        print(f"Registros mes actual encontrados: {len(current_month_records)}")
 
         # Calcular mes anterior
         if last_month == 1:
@@ -154,84 +268,48 @@ async def search_per_month(message_data: Dict[str, Any], type_model: Any, value_
             prev_month = last_month - 1
             prev_year = last_year
 
-        # Crear fechas de inicio y fin para el mes anterior
         prev_month_start = datetime(prev_year, prev_month, 1).date()
-        prev_month_end = current_month_start
-
-        prev_month_records = await type_model.filter(
-            fecha__gte=prev_month_start,
-            fecha__lt=prev_month_end
-        ).all()
-        
-        print(f"Registros mes anterior encontrados: {len(prev_month_records)}")
 
-        # Calcular medias
-        prom_actual = round(calculate_mean1(current_month_records, value_field_name), 2)
-        prom_anterior = round(calculate_mean1(prev_month_records, value_field_name), 2)
-        print(f"Promedios calculados - Actual: {prom_actual}, Anterior: {prom_anterior}")
+        # Promedios calculados por la base de datos
+        stats = period_stats(aggregates, 2)
 
         # Obtener nombres de los meses
-        try:
-            locale.setlocale(locale.LC_TIME, 'es_ES.UTF-8')
-        except:
-            try:
-                locale.setlocale(locale.LC_TIME, 'Spanish_Spain.1252')
-            except:
-                pass
-
-        current_month_name = current_month_start.strftime("%B %Y")
-        prev_month_name = prev_month_start.strftime("%B %Y")
-
-        print(f"Nombres de meses obtenidos - Actual: {current_month_name}, Anterior: {prev_month_name}")
+        current_month_name = month_label(current_month_start)
+        prev_month_name = month_label(prev_month_start)
 
         return {
             'success': True,
             'fechaActual': current_month_name,
             'fechaAnterior': prev_month_name,
-            'promActual': prom_actual,
-            'promAnterior': prom_anterior,
+            'inicioActual': current_month_start.isoformat(),
+            'inicioAnterior': prev_month_start.isoformat(),
+            **stats,
             'tiempo': 'mes',
             'tipo': value_field_name
         }
 
     except Exception as error:
-        print(f"Error general en search_per_month: {str(error)}")
-        print(f"Tipo de error: {type(error)}")
-        import traceback
-        print(f"Traceback completo: {traceback.format_exc()}")
+        logger.error(f"Error en search_per_month: {type(error).__name__}: {error}")
         return {
             'success': False,
             'message': "Error interno",
             'error': str(error)
         }
         
+@timed(DB_QUERY_LATENCY, function="search_per_day")
 async def search_per_day(message_data: Dict[str, Any], type_model: Model, value_field_name: str) -> Dict[str, Any]:
     try:
-        # Obtener el último registro
-        last_record = await type_model.filter().order_by('-fecha').first()
+        # Agregados del último día con registros y del día anterior
+        aggregates = await fetch_aggregates(type_model, value_field_name, 'dia')
 
-        if not last_record:
+        if not aggregates:
             return {
                 'success': False,
                 'message': "No se encontraron datos"
             }
 
-        last_date = last_record.fecha
-
-        # Buscar registros del día actual
-        current_day_records = await type_model.filter(
-            fecha=last_date
-        )
-
-        # Buscar registros del día anterior
+        last_date = aggregates['ultima']
         prev_date = last_date - timedelta(days=1)
-        prev_day_records = await type_model.filter(
-            fecha=prev_date
-        )
-
-        # Calcular medias
-        prom_actual = calculate_mean(current_day_records, value_field_name)
-        prom_anterior = calculate_mean(prev_day_records, value_field_name)
 
         # Formatear fechas
         fecha_actual = last_date.strftime('%d-%m-%Y')
@@ -241,8 +319,9 @@ async def search_per_day(message_data: Dict[str, Any], type_model: Model, value_
             'success': True,
             'fechaActual': fecha_actual,
             'fechaAnterior': fecha_anterior,
-            'promActual': prom_actual,
-            'promAnterior': prom_anterior,
+            'inicioActual': last_date.isoformat(),
+            'inicioAnterior': prev_date.isoformat(),
+            **period_stats(aggregates),
             'tiempo': 'dia',
             'tipo': value_field_name
         }
@@ -259,17 +338,19 @@ def get_week_of_month(date: datetime) -> int:
     start_of_month = date.replace(day=1)
     return (date.day + start_of_month.weekday()) // 7 + 1
 
+@timed(DB_QUERY_LATENCY, function="search_per_week")
 async def search_per_week(message_data: Dict[str, Any], type_model: Any, value_field_name: str) -> Dict[str, Any]:
     try:
-        last_record = await type_model.filter().order_by('-fecha').first()
+        # Agregados de la semana del último registro y de la semana anterior
+        aggregates = await fetch_aggregates(type_model, value_field_name, 'semana')
 
-        if not last_record:
+        if not aggregates:
             return {
                 'success': False,
                 'message': "No se encontraron datos"
             }
 
-        last_date = last_record.fecha
+        last_date = aggregates['ultima']
         
         # Calculate week start and end for current week
         current_week_start = last_date - timedelta(days=last_date.weekday())
@@ -279,28 +360,13 @@ async def search_per_week(message_data: Dict[str, Any], type_model: Any, value_f
         prev_week_start = current_week_start - timedelta(days=7)
         prev_week_end = prev_week_start + timedelta(days=6)
 
-        # Buscar registros de la semana actual 
-        current_week_records = await type_model.filter(
-            fecha__gte=current_week_start,
-            fecha__lte=current_week_end
-        )
-
-        # Buscar registros de la semana anterior
-        prev_week_records = await type_model.filter(
-            fecha__gte=prev_week_start,
-            fecha__lte=prev_week_end
-        )
-
-        # Calcular medias
-        prom_actual = calculate_mean(current_week_records, value_field_name)
-        prom_anterior = calculate_mean(prev_week_records, value_field_name)
-
         return {
             'success': True,
             'fechaActual': f'{current_week_start.strftime("%d-%m-%Y")} a {current_week_end.strftime("%d-%m-%Y")}',
             'fechaAnterior': f'{prev_week_start.strftime("%d-%m-%Y")} a {prev_week_end.strftime("%d-%m-%Y")}',
-            'promActual': prom_actual,
-            'promAnterior': prom_anterior,
+            'inicioActual': current_week_start.isoformat(),
+            'inicioAnterior': prev_week_start.isoformat(),
+            **period_stats(aggregates),
             'tiempo': 'semana',
             'tipo': value_field_name
         }
@@ -310,4 +376,124 @@ async def search_per_week(message_data: Dict[str, Any], type_model: Any, value_f
             'success': False,
             'message': "Error interno",
             'error': str(error)
-        }
\ No newline at end of file
+        }
+
+def period_labels(tiempo: str, inicio_actual, inicio_anterior) -> Dict[str, str]:
+    """Etiquetas fechaActual/fechaAnterior a partir del inicio de cada periodo."""
+    if tiempo == 'semana':
+        return {
+            'fechaActual': f'{inicio_actual.strftime("%d-%m-%Y")} a {(inicio_actual + timedelta(days=6)).strftime("%d-%m-%Y")}',
+            'fechaAnterior': f'{inicio_anterior.strftime("%d-%m-%Y")} a {(inicio_anterior + timedelta(days=6)).strftime("%d-%m-%Y")}'
+        }
+    if tiempo == 'mes':
+        return {
+            'fechaActual': month_label(inicio_actual),
+            'fechaAnterior': month_label(inicio_anterior)
+        }
+    return {
+        'fechaActual': inicio_actual.strftime('%d-%m-%Y'),
+        'fechaAnterior': inicio_anterior.strftime('%d-%m-%Y')
+    }
+
+def format_live_stats(value_field_name: str, tiempo: str, aggregates: Dict[str, Any]) -> Dict[str, Any]:
+    """Arma una respuesta con el mismo formato que getBPMRecords/getTempRecords."""
+    inicio_actual = aggregates['ultima']
+    inicio_anterior = previous_start(inicio_actual, tiempo)
+    return {
+        'success': True,
+        **period_labels(tiempo, inicio_actual, inicio_anterior),
+        'inicioActual': inicio_actual.isoformat(),
+        'inicioAnterior': inicio_anterior.isoformat(),
+        **period_stats(aggregates, 2 if tiempo == 'mes' else None),
+        'tiempo': tiempo,
+        'tipo': value_field_name
+    }
+
+# Estadísticas en vivo: se actualizan con cada lote escrito (inserciones y lecturas MQTT)
+live_stats = LiveStats(fetch_aggregates, format_live_stats)
+writer.add_flush_listener(live_stats.on_flush)
+
+# Ancho de los intervalos de una serie: segundos o número con unidad (30s, 5m, 1h, 1d)
+BUCKET_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Máximo de intervalos de ancho fijo que puede pedir una serie
+HISTORY_MAX_POINTS = int(os.getenv("HISTORY_MAX_POINTS", 5000))
+
+def parse_bucket(value: Any):
+    """Retorna el ancho en segundos, o el periodo de calendario ('dia', 'semana', 'mes')."""
+    if value in PERIODS:
+        return value
+    if isinstance(value, str) and value[-1:] in BUCKET_UNITS:
+        seconds = int(value[:-1]) * BUCKET_UNITS[value[-1]]
+    else:
+        seconds = int(value)
+    if seconds <= 0:
+        raise ValueError("El intervalo debe ser positivo")
+    return seconds
+
+def parse_fecha(value: str) -> datetime:
+    """Fecha ISO 8601 como hora local sin zona, igual que se guarda `fecha`."""
+    fecha = datetime.fromisoformat(value)
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone().replace(tzinfo=None)
+    return fecha
+
+def history_error(message: str) -> Dict[str, Any]:
+    return {
+        'success': False,
+        'event': 'getHistorySeries',
+        'message': message
+    }
+
+@timed(DB_QUERY_LATENCY, function="history_series")
+async def getHistorySeries(message_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Serie histórica de 'tipo' entre 'desde' y 'hasta' (ISO 8601), agrupada
+    en intervalos de 'bucket' con el agregado 'agregado' (promedio por defecto).
+
+    Los periodos de calendario se leen de los rollups (periodos completos);
+    los intervalos de ancho fijo se agrupan en la base de datos.
+    """
+    tipo = message_data.get('tipo')
+    agregado = message_data.get('agregado', 'promedio')
+    if tipo not in STATS_MODELS:
+        return history_error("Tipo inválido")
+    if agregado not in SERIES_AGGREGATES:
+        return history_error(f"Agregado inválido, use uno de: {', '.join(SERIES_AGGREGATES)}")
+
+    try:
+        hasta = parse_fecha(message_data['hasta']) if message_data.get('hasta') else datetime.now()
+        desde = parse_fecha(message_data['desde']) if message_data.get('desde') else hasta - timedelta(days=1)
+        bucket = parse_bucket(message_data.get('bucket', '5m'))
+    except (TypeError, ValueError):
+        return history_error("Rango o intervalo inválido")
+
+    if desde >= hasta:
+        return history_error("'desde' debe ser anterior a 'hasta'")
+    if not isinstance(bucket, str) and (hasta - desde).total_seconds() / bucket > HISTORY_MAX_POINTS:
+        return history_error(f"El rango pedido supera {HISTORY_MAX_POINTS} intervalos")
+
+    type_model = STATS_MODELS[tipo]
+    try:
+        series = None
+        if isinstance(bucket, str) and STATS_SOURCE == "rollups":
+            # Último día que toca el rango, para incluir el periodo que contiene a 'hasta'
+            ultimo_dia = (hasta - timedelta(microseconds=1)).date()
+            series = await rollup_series(type_model, bucket, desde.date(), ultimo_dia + timedelta(days=1), agregado)
+        if not series:
+            series = await history_series(type_model, tipo, desde, hasta, bucket, agregado)
+    except Exception as error:
+        logger.error(f"Error en getHistorySeries: {error}")
+        return history_error("Error interno")
+
+    return {
+        'success': True,
+        'event': 'getHistorySeries',
+        'tipo': tipo,
+        'agregado': agregado,
+        'bucket': message_data.get('bucket', '5m'),
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'fechas': [inicio.isoformat() for inicio, _ in series],
+        'valores': [valor for _, valor in series]
+    }
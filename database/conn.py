@@ -1,29 +1,144 @@
+import asyncio
 import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict
 from loguru import logger
 from dotenv import load_dotenv
-from tortoise import Tortoise
+from tortoise import Tortoise, connections
+from tortoise.context import TortoiseContext, get_current_context
 
 load_dotenv()
 
-async def connectToDatabase():
+MODELS = ["models.BPM", "models.TempModel", "models.Rollups"]
+
+# Conexión que usan las consultas de estadísticas ("replica" si está disponible)
+_read_connection = "default"
+
+# True dentro de read_from_primary(): las lecturas ignoran la réplica
+_primary_reads: ContextVar[bool] = ContextVar("primary_reads", default=False)
+
+def _connection_config(prefix: str, fallback: str = None) -> Any:
+    """Arma la configuración de una conexión MySQL a partir de variables <prefix>_*."""
+    def env(name: str, default: str = None) -> str:
+        value = os.getenv(f"{prefix}_{name}")
+        if value is None and fallback:
+            value = os.getenv(f"{fallback}_{name}")
+        return default if value is None else value
+
+    # Una URL completa (p. ej. sqlite://:memory:) tiene prioridad sobre los campos sueltos
+    db_url = os.getenv(f"{prefix}_URL")
+    if db_url:
+        return db_url
+
+    return {
+        "engine": "tortoise.backends.mysql",
+        "credentials": {
+            "host": env("HOST", "localhost"),
+            "port": int(env("PORT", "3306")),
+            "user": env("USER", "root"),
+            "password": env("PASSWORD", ""),
+            "database": env("NAME", "vitalGuard"),
+            "minsize": int(env("POOL_MIN", "1")),
+            "maxsize": int(env("POOL_MAX", "10")),
+            "pool_recycle": int(env("POOL_RECYCLE", "3600")),
+            "connect_timeout": int(env("CONNECT_TIMEOUT", "10"))
+        }
+    }
+
+def build_config() -> Dict[str, Any]:
+    """Configuración de Tortoise: conexión principal y, opcionalmente, una réplica de lectura."""
+    db_connections = {"default": _connection_config("DB")}
+    if os.getenv("DB_REPLICA_HOST") or os.getenv("DB_REPLICA_URL"):
+        db_connections["replica"] = _connection_config("DB_REPLICA", fallback="DB")
+
+    # `fecha` se guarda como hora local sin zona (datetime.now()): Tortoise no debe convertirla
+    return {
+        "connections": db_connections,
+        "apps": {
+            "models": {
+                "models": MODELS,
+                "default_connection": "default"
+            }
+        },
+        "use_tz": False,
+        "timezone": os.getenv("DB_TIMEZONE", "UTC")
+    }
+
+def get_read_connection():
+    """Conexión para consultas de solo lectura (estadísticas)."""
+    return connections.get("default" if _primary_reads.get() else _read_connection)
+
+@contextmanager
+def read_from_primary():
+    """Envía a la conexión principal las lecturas del bloque y de las tareas creadas en él.
+
+    Sirve para no leer de la réplica datos que aún no le llegaron.
+    """
+    token = _primary_reads.set(True)
     try:
-        async def init_orm():
-            db_user = os.getenv("DB_USER", "root")
-            db_password = os.getenv("DB_PASSWORD", "")
-            db_host = os.getenv("DB_HOST", "localhost")
-            db_name = os.getenv("DB_NAME", "vitalGuard")
-
-            db_url = f"mysql://{db_user}:{db_password}@{db_host}/{db_name}"
-
-            await Tortoise.init(
-                db_url=db_url,
-                modules={"models": ["models.BPM", "models.TempModel"]}
-            )
-            await Tortoise.generate_schemas()
-            logger.info("Conexión a la base de datos establecida.")
-            
-        await init_orm()
-    
+        yield
+    finally:
+        _primary_reads.reset(token)
+
+async def pingDatabase(name: str = "default") -> bool:
+    """Verifica que la conexión responda; abre el pool si aún no existe."""
+    try:
+        await connections.get(name).execute_query("SELECT 1")
+        return True
     except Exception as e:
-        logger.error(f"La conexión a la base de datos falló.\n{e}")
-        return None
+        logger.warning(f"La conexión '{name}' no responde: {e}")
+        return False
+
+def activateDatabaseContext():
+    """Activa el contexto de Tortoise en la tarea actual, antes de conectar.
+
+    Tortoise guarda su estado en un contextvar: las tareas creadas después
+    de esta llamada (p. ej. las del listener WebSocket, que arranca en
+    paralelo con la base) comparten el mismo contexto y ven las conexiones
+    en cuanto connectToDatabase termina.
+    """
+    if get_current_context() is None:
+        TortoiseContext().__enter__()
+
+async def connectToDatabase():
+    """Inicializa el ORM con reintentos y backoff exponencial.
+
+    Lanza la última excepción si la base de datos no responde tras
+    DB_CONNECT_RETRIES intentos. No genera esquemas: eso se hace con
+    python -m database.migrate
+    """
+    global _read_connection
+
+    retries = int(os.getenv("DB_CONNECT_RETRIES", 5))
+    backoff = float(os.getenv("DB_CONNECT_BACKOFF", 1))
+    max_backoff = float(os.getenv("DB_CONNECT_MAX_BACKOFF", 30))
+    config = build_config()
+
+    for attempt in range(1, retries + 1):
+        try:
+            await Tortoise.init(config=config)
+            await connections.get("default").execute_query("SELECT 1")
+            break
+        except Exception as e:
+            await Tortoise.close_connections()
+            if attempt == retries:
+                logger.error(f"La conexión a la base de datos falló.\n{e}")
+                raise
+            delay = min(backoff * 2 ** (attempt - 1), max_backoff)
+            logger.warning(f"Intento {attempt} de conexión a la base de datos falló, reintentando en {delay}s: {e}")
+            await asyncio.sleep(delay)
+
+    _read_connection = "default"
+    if "replica" in config["connections"]:
+        if await pingDatabase("replica"):
+            _read_connection = "replica"
+            logger.info("Réplica de lectura disponible para las estadísticas.")
+        else:
+            logger.warning("Réplica de lectura no disponible, las estadísticas usarán la conexión principal.")
+
+    logger.info("Conexión a la base de datos establecida.")
+
+async def closeDatabase():
+    """Cierra los pools de conexiones."""
+    await Tortoise.close_connections()
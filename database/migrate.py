@@ -0,0 +1,178 @@
+import argparse
+import asyncio
+import os
+from datetime import date
+from typing import List
+
+from loguru import logger
+from tortoise import Tortoise, connections
+
+from database.conn import closeDatabase, connectToDatabase
+
+# Tablas de lecturas y su columna de valor
+READING_TABLES = {
+    "bpm": "bpm",
+    "temperaturas": "temperatura"
+}
+
+MAX_PARTITION = "pmax"
+
+
+async def generate_schemas():
+    """Crea las tablas e índices que falten. No modifica tablas existentes."""
+    await Tortoise.generate_schemas(safe=True)
+    logger.info("Esquemas de la base de datos generados.")
+
+
+async def _column_type(connection, table: str, column: str) -> str:
+    rows = await connection.execute_query_dict(
+        "SELECT COLUMN_TYPE AS tipo FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        [table, column]
+    )
+    return rows[0]["tipo"].lower() if rows else ""
+
+
+async def _index_columns(connection, table: str) -> List[List[str]]:
+    rows = await connection.execute_query_dict(
+        "SELECT INDEX_NAME AS indice, COLUMN_NAME AS columna FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+        [table]
+    )
+    indexes = {}
+    for row in rows:
+        indexes.setdefault(row["indice"], []).append(row["columna"])
+    return list(indexes.values())
+
+
+async def upgrade():
+    """Lleva las tablas del esquema anterior (fecha DATE, valor INT) al esquema de series de tiempo.
+
+    Cambia fecha a DATETIME(6), el valor a DOUBLE, agrega la columna
+    dispositivo y los índices (fecha) y (dispositivo, fecha). Cada paso se
+    omite si ya está aplicado. Solo para MySQL.
+    """
+    connection = connections.get("default")
+    if connection.capabilities.dialect != "mysql":
+        logger.warning("La actualización de esquema solo aplica a MySQL; use generate_schemas.")
+        return
+
+    for table, column in READING_TABLES.items():
+        changes = []
+        if not (await _column_type(connection, table, "fecha")).startswith("datetime"):
+            changes.append("MODIFY fecha DATETIME(6) NOT NULL")
+        if await _column_type(connection, table, column) != "double":
+            changes.append(f"MODIFY {column} DOUBLE NOT NULL")
+        if not await _column_type(connection, table, "dispositivo"):
+            changes.append("ADD COLUMN dispositivo VARCHAR(64) NULL")
+
+        indexes = await _index_columns(connection, table)
+        if not any(columns[0] == "fecha" for columns in indexes):
+            changes.append(f"ADD INDEX idx_{table}_fecha (fecha)")
+        if ["dispositivo", "fecha"] not in indexes:
+            changes.append(f"ADD INDEX idx_{table}_dispositivo_fecha (dispositivo, fecha)")
+
+        if changes:
+            await connection.execute_script(f"ALTER TABLE {table} {', '.join(changes)}")
+            logger.info(f"Tabla {table} actualizada: {'; '.join(changes)}")
+        else:
+            logger.info(f"Tabla {table} ya está actualizada")
+
+
+def _month_add(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_clause(month: date) -> str:
+    limit = _month_add(month, 1)
+    return f"PARTITION p{month.strftime('%Y%m')} VALUES LESS THAN (TO_DAYS('{limit.isoformat()}'))"
+
+
+async def _partitions(connection, table: str) -> List[str]:
+    rows = await connection.execute_query_dict(
+        "SELECT PARTITION_NAME AS particion FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        [table]
+    )
+    return [row["particion"] for row in rows]
+
+
+async def partition(months_ahead: int):
+    """Particiona las tablas de lecturas por rango mensual de fecha, o agrega los meses que falten.
+
+    MySQL exige que la columna de partición forme parte de la llave primaria,
+    por lo que la llave pasa a ser (id, fecha). Se mantiene una partición
+    pmax para las fechas fuera de rango.
+    """
+    connection = connections.get("default")
+    if connection.capabilities.dialect != "mysql":
+        logger.warning("El particionamiento solo aplica a MySQL.")
+        return
+
+    last_month = _month_add(date.today().replace(day=1), months_ahead)
+    for table in READING_TABLES:
+        existing = await _partitions(connection, table)
+
+        if not existing:
+            rows = await connection.execute_query_dict(f"SELECT DATE(MIN(fecha)) AS primera FROM {table}")
+            first = rows[0]["primera"] if rows and rows[0]["primera"] else date.today()
+            month = date.fromisoformat(str(first)[:10]).replace(day=1)
+
+            clauses = []
+            while month <= last_month:
+                clauses.append(_partition_clause(month))
+                month = _month_add(month, 1)
+            clauses.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+
+            await connection.execute_script(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, fecha)")
+            await connection.execute_script(
+                f"ALTER TABLE {table} PARTITION BY RANGE (TO_DAYS(fecha)) ({', '.join(clauses)})"
+            )
+            logger.info(f"Tabla {table} particionada en {len(clauses)} particiones")
+            continue
+
+        # Agregar meses futuros dividiendo la partición pmax
+        monthly = [name for name in existing if name != MAX_PARTITION]
+        newest = date(int(monthly[-1][1:5]), int(monthly[-1][5:7]), 1) if monthly else date.today().replace(day=1)
+        month = _month_add(newest, 1)
+        clauses = []
+        while month <= last_month:
+            clauses.append(_partition_clause(month))
+            month = _month_add(month, 1)
+
+        if clauses:
+            clauses.append(f"PARTITION {MAX_PARTITION} VALUES LESS THAN MAXVALUE")
+            await connection.execute_script(
+                f"ALTER TABLE {table} REORGANIZE PARTITION {MAX_PARTITION} INTO ({', '.join(clauses)})"
+            )
+            logger.info(f"Tabla {table}: {len(clauses) - 1} particiones mensuales agregadas")
+
+
+async def main():
+    """python -m database.migrate [schemas|upgrade|partition]"""
+    parser = argparse.ArgumentParser(description="Migraciones de la base de datos")
+    parser.add_argument("command", nargs="?", default="schemas", choices=["schemas", "upgrade", "partition"])
+    parser.add_argument(
+        "--months-ahead",
+        type=int,
+        default=int(os.getenv("DB_PARTITION_MONTHS_AHEAD", 3)),
+        help="Meses futuros con partición propia"
+    )
+    args = parser.parse_args()
+
+    await connectToDatabase()
+    try:
+        if args.command == "schemas":
+            await generate_schemas()
+        elif args.command == "upgrade":
+            await upgrade()
+        else:
+            await partition(args.months_ahead)
+    finally:
+        await closeDatabase()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+from array import array
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from tortoise.models import Model
+from database.conn import get_read_connection
+
+# Inicio del periodo (día, semana ISO o mes) que contiene a la fecha {x}
+PERIOD_START = {
+    "mysql": {
+        "dia": "DATE({x})",
+        "semana": "DATE_SUB(DATE({x}), INTERVAL WEEKDAY({x}) DAY)",
+        "mes": "DATE_SUB(DATE({x}), INTERVAL DAYOFMONTH({x}) - 1 DAY)"
+    },
+    "sqlite": {
+        "dia": "DATE({x})",
+        "semana": "DATE({x}, 'weekday 0', '-6 days')",
+        "mes": "DATE({x}, 'start of month')"
+    }
+}
+
+# Inicio del periodo anterior a partir del inicio del periodo {x}
+PREVIOUS_START = {
+    "mysql": {
+        "dia": "DATE_SUB({x}, INTERVAL 1 DAY)",
+        "semana": "DATE_SUB({x}, INTERVAL 7 DAY)",
+        "mes": "DATE_SUB({x}, INTERVAL 1 MONTH)"
+    },
+    "sqlite": {
+        "dia": "DATE({x}, '-1 day')",
+        "semana": "DATE({x}, '-7 days')",
+        "mes": "DATE({x}, '-1 month')"
+    }
+}
+
+# Índice del intervalo de {bucket} segundos, contado desde {since}, al que pertenece fecha
+BUCKET_INDEX = {
+    "mysql": "TIMESTAMPDIFF(SECOND, %s, fecha) DIV %s",
+    "sqlite": "CAST(ROUND((julianday(fecha) - julianday(?)) * 86400, 3) AS INTEGER) / ?"
+}
+
+PLACEHOLDER = {
+    "mysql": "%s",
+    "sqlite": "?"
+}
+
+# Agregados que admite una serie histórica
+SERIES_AGGREGATES = {
+    "promedio": "AVG({column})",
+    "minimo": "MIN({column})",
+    "maximo": "MAX({column})",
+    "suma": "SUM({column})",
+    "conteo": "COUNT(*)"
+}
+
+SERIES_SQL = """
+SELECT {bucket} AS bucket, {aggregate} AS valor
+FROM {table}
+WHERE fecha >= {placeholder} AND fecha < {placeholder}
+GROUP BY bucket
+ORDER BY bucket
+"""
+
+PERIOD_AGGREGATES_SQL = """
+SELECT
+    CASE WHEN t.fecha >= p.inicio THEN 'actual' ELSE 'anterior' END AS periodo,
+    p.ultima AS ultima,
+    AVG(t.{column}) AS promedio,
+    COUNT(*) AS total,
+    MIN(t.{column}) AS minimo,
+    MAX(t.{column}) AS maximo
+FROM {table} AS t
+JOIN (
+    SELECT u.ultima, {start} AS inicio, {previous} AS anterior
+    FROM (SELECT DATE(MAX(fecha)) AS ultima FROM {table}) AS u
+) AS p ON t.fecha >= p.anterior
+GROUP BY periodo, p.ultima
+"""
+
+
+def dialect_of(connection) -> str:
+    dialect = connection.capabilities.dialect
+    if dialect not in PERIOD_START:
+        raise ValueError(f"Dialecto SQL no soportado: {dialect}")
+    return dialect
+
+
+def column_of(type_model: Model, value_field_name: str) -> str:
+    field = type_model._meta.fields_map[value_field_name]
+    return field.source_field or value_field_name
+
+
+def to_date(value: Any) -> date:
+    """Normaliza las fechas que retorna cada driver (date, datetime o texto ISO)."""
+    if isinstance(value, date):
+        return value if type(value) is date else value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+def _empty_stats() -> Dict[str, Any]:
+    return {"promedio": 0.0, "total": 0, "minimo": None, "maximo": None}
+
+
+async def period_aggregates(type_model: Model, value_field_name: str, tiempo: str) -> Optional[Dict[str, Any]]:
+    """Calcula AVG/COUNT/MIN/MAX del periodo más reciente y del anterior.
+
+    Todo se resuelve en una sola consulta agrupada: la fecha del último
+    registro, los límites de ambos periodos y sus agregados. Retorna None si
+    la tabla no tiene registros.
+    """
+    connection = get_read_connection()
+    dialect = dialect_of(connection)
+    start = PERIOD_START[dialect][tiempo].format(x="u.ultima")
+    sql = PERIOD_AGGREGATES_SQL.format(
+        table=type_model._meta.db_table,
+        column=column_of(type_model, value_field_name),
+        start=start,
+        previous=PREVIOUS_START[dialect][tiempo].format(x=start)
+    )
+
+    rows = await connection.execute_query_dict(sql)
+    if not rows:
+        return None
+
+    result = {
+        "ultima": to_date(rows[0]["ultima"]),
+        "actual": _empty_stats(),
+        "anterior": _empty_stats()
+    }
+    for row in rows:
+        result[row["periodo"]] = {
+            "promedio": float(row["promedio"]),
+            "total": int(row["total"]),
+            "minimo": float(row["minimo"]),
+            "maximo": float(row["maximo"])
+        }
+    return result
+
+
+async def period_values(type_model: Model, value_field_name: str, start: date, end: date) -> array:
+    """Valores de las lecturas con fecha en [start, end) como arreglo columnar de floats."""
+    values = await type_model.filter(
+        fecha__gte=datetime.combine(start, time.min),
+        fecha__lt=datetime.combine(end, time.min)
+    ).using_db(get_read_connection()).values_list(value_field_name, flat=True)
+    return array("d", values)
+
+
+async def history_series(
+    type_model: Model,
+    value_field_name: str,
+    since: datetime,
+    until: datetime,
+    bucket: Any,
+    aggregate: str
+) -> List[Tuple[Any, float]]:
+    """Serie agregada en la base de datos: una fila por intervalo con lecturas.
+
+    `bucket` es un ancho en segundos o un periodo de calendario ('dia',
+    'semana', 'mes'). Retorna [(inicio del intervalo, valor)] ordenada; las
+    lecturas crudas nunca salen de la base de datos.
+    """
+    connection = get_read_connection()
+    dialect = dialect_of(connection)
+    fecha = type_model._meta.fields_map["fecha"]
+    start, end = fecha.to_db_value(since, type_model), fecha.to_db_value(until, type_model)
+
+    if isinstance(bucket, str):
+        expression, params = PERIOD_START[dialect][bucket].format(x="fecha"), []
+    else:
+        expression, params = BUCKET_INDEX[dialect], [start, int(bucket)]
+
+    sql = SERIES_SQL.format(
+        bucket=expression,
+        aggregate=SERIES_AGGREGATES[aggregate].format(column=column_of(type_model, value_field_name)),
+        table=type_model._meta.db_table,
+        placeholder=PLACEHOLDER[dialect]
+    )
+    rows = await connection.execute_query_dict(sql, params + [start, end])
+
+    if isinstance(bucket, str):
+        return [(to_date(row["bucket"]), float(row["valor"])) for row in rows]
+    return [(since + timedelta(seconds=int(row["bucket"]) * int(bucket)), float(row["valor"])) for row in rows]
@@ -0,0 +1,249 @@
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+from tortoise.models import Model
+
+from models.BPM import BPMModel
+from models.TempModel import TempModel
+from models.Rollups import BPMRollupModel, TempRollupModel
+from database.conn import get_read_connection
+from database.queries import column_of, dialect_of, to_date
+
+GRANULARITIES = ("dia", "semana", "mes")
+
+# Tabla de agregados de cada modelo de lecturas
+ROLLUP_MODELS = {
+    BPMModel: BPMRollupModel,
+    TempModel: TempRollupModel
+}
+
+# Campo con el valor de la lectura en cada modelo
+VALUE_FIELDS = {
+    BPMModel: "bpm",
+    TempModel: "temperatura"
+}
+
+UPSERT_SQL = {
+    "mysql": """
+INSERT INTO {table} (granularidad, inicio, suma, conteo, minimo, maximo)
+VALUES (%s, %s, %s, %s, %s, %s)
+ON DUPLICATE KEY UPDATE
+    suma = suma + VALUES(suma),
+    conteo = conteo + VALUES(conteo),
+    minimo = LEAST(minimo, VALUES(minimo)),
+    maximo = GREATEST(maximo, VALUES(maximo))
+""",
+    "sqlite": """
+INSERT INTO {table} (granularidad, inicio, suma, conteo, minimo, maximo)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (granularidad, inicio) DO UPDATE SET
+    suma = suma + excluded.suma,
+    conteo = conteo + excluded.conteo,
+    minimo = MIN(minimo, excluded.minimo),
+    maximo = MAX(maximo, excluded.maximo)
+"""
+}
+
+DAILY_SQL = """
+SELECT DATE(fecha) AS dia, SUM({column}) AS suma, COUNT(*) AS conteo,
+       MIN({column}) AS minimo, MAX({column}) AS maximo
+FROM {table}
+GROUP BY DATE(fecha)
+"""
+
+
+def period_start(day: date, granularidad: str) -> date:
+    """Inicio del día, semana ISO (lunes) o mes que contiene a la fecha."""
+    if granularidad == "semana":
+        return day - timedelta(days=day.weekday())
+    if granularidad == "mes":
+        return day.replace(day=1)
+    return day
+
+
+def previous_start(start: date, granularidad: str) -> date:
+    """Inicio del periodo inmediatamente anterior."""
+    if granularidad == "semana":
+        return start - timedelta(days=7)
+    if granularidad == "mes":
+        return (start - timedelta(days=1)).replace(day=1)
+    return start - timedelta(days=1)
+
+
+def next_start(start: date, granularidad: str) -> date:
+    """Inicio del periodo inmediatamente siguiente."""
+    if granularidad == "semana":
+        return start + timedelta(days=7)
+    if granularidad == "mes":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _merge(totals: Dict[Tuple[str, date], List[float]], key: Tuple[str, date], suma: float, conteo: int, minimo: float, maximo: float):
+    current = totals.get(key)
+    if current is None:
+        totals[key] = [suma, conteo, minimo, maximo]
+    else:
+        current[0] += suma
+        current[1] += conteo
+        current[2] = min(current[2], minimo)
+        current[3] = max(current[3], maximo)
+
+
+def rollup_deltas(rows: Iterable[Tuple[float, datetime]]) -> Dict[Tuple[str, date], List[float]]:
+    """Agrupa un lote de lecturas en incrementos por (granularidad, inicio)."""
+    totals: Dict[Tuple[str, date], List[float]] = {}
+    for value, fecha in rows:
+        day = to_date(fecha)
+        for granularidad in GRANULARITIES:
+            _merge(totals, (granularidad, period_start(day, granularidad)), value, 1, value, value)
+    return totals
+
+
+async def apply_rollups(type_model: Model, rows: List[Tuple[float, datetime]], connection) -> bool:
+    """Suma un lote de lecturas a los agregados del modelo dentro de la conexión dada."""
+    rollup_model = ROLLUP_MODELS.get(type_model)
+    if rollup_model is None:
+        return False
+
+    sql = UPSERT_SQL[dialect_of(connection)].format(table=rollup_model._meta.db_table)
+    values = [
+        [granularidad, inicio.isoformat(), suma, conteo, minimo, maximo]
+        for (granularidad, inicio), (suma, conteo, minimo, maximo) in rollup_deltas(rows).items()
+    ]
+    await connection.execute_many(sql, values)
+    return True
+
+
+def _rollup_stats(row: Optional[Model]) -> Dict[str, Any]:
+    if row is None or not row.conteo:
+        return {"promedio": 0.0, "total": 0, "minimo": None, "maximo": None}
+    return {
+        "promedio": row.suma / row.conteo,
+        "total": row.conteo,
+        "minimo": row.minimo,
+        "maximo": row.maximo
+    }
+
+
+async def rollup_aggregates(type_model: Model, tiempo: str) -> Optional[Dict[str, Any]]:
+    """Lee los agregados del periodo más reciente y del anterior desde la tabla de rollups.
+
+    Solo lee dos filas sin importar cuántas lecturas haya. 'ultima' es el
+    inicio del periodo más reciente. Retorna None si no hay agregados.
+    """
+    rollup_model = ROLLUP_MODELS.get(type_model)
+    if rollup_model is None:
+        return None
+
+    rows = await rollup_model.filter(granularidad=tiempo).using_db(
+        get_read_connection()
+    ).order_by("-inicio").limit(2)
+    if not rows:
+        return None
+
+    current = rows[0]
+    inicio = to_date(current.inicio)
+    previous = None
+    if len(rows) > 1 and to_date(rows[1].inicio) == previous_start(inicio, tiempo):
+        previous = rows[1]
+
+    return {
+        "ultima": inicio,
+        "actual": _rollup_stats(current),
+        "anterior": _rollup_stats(previous)
+    }
+
+
+def _rollup_value(row: Model, aggregate: str) -> float:
+    if aggregate == "promedio":
+        return row.suma / row.conteo
+    if aggregate == "suma":
+        return row.suma
+    if aggregate == "conteo":
+        return row.conteo
+    return row.minimo if aggregate == "minimo" else row.maximo
+
+
+async def rollup_series(type_model: Model, granularidad: str, since: date, until: date, aggregate: str) -> Optional[List[Tuple[date, float]]]:
+    """Serie por día, semana o mes leída de los rollups: una fila por periodo.
+
+    Incluye los periodos que se solapan con [since, until). Retorna None si
+    el modelo no tiene tabla de agregados.
+    """
+    rollup_model = ROLLUP_MODELS.get(type_model)
+    if rollup_model is None:
+        return None
+
+    rows = await rollup_model.filter(
+        granularidad=granularidad,
+        inicio__gte=period_start(since, granularidad),
+        inicio__lt=until
+    ).using_db(get_read_connection()).order_by("inicio")
+    return [(to_date(row.inicio), float(_rollup_value(row, aggregate))) for row in rows if row.conteo]
+
+
+async def backfill(type_model: Model) -> int:
+    """Reconstruye los agregados de un modelo a partir de sus lecturas.
+
+    Agrupa por día en la base de datos y deriva semanas y meses de esas
+    filas. Conviene ejecutarlo sin escrituras en curso. Retorna cuántas
+    filas de agregados se generaron.
+    """
+    rollup_model = ROLLUP_MODELS[type_model]
+    value_field_name = VALUE_FIELDS[type_model]
+
+    async with in_transaction("default") as connection:
+        daily = await connection.execute_query_dict(DAILY_SQL.format(
+            table=type_model._meta.db_table,
+            column=column_of(type_model, value_field_name)
+        ))
+
+        totals: Dict[Tuple[str, date], List[float]] = {}
+        for row in daily:
+            day = to_date(row["dia"])
+            for granularidad in GRANULARITIES:
+                _merge(
+                    totals,
+                    (granularidad, period_start(day, granularidad)),
+                    float(row["suma"]),
+                    int(row["conteo"]),
+                    float(row["minimo"]),
+                    float(row["maximo"])
+                )
+
+        await rollup_model.all().using_db(connection).delete()
+        await rollup_model.bulk_create([
+            rollup_model(
+                granularidad=granularidad,
+                inicio=inicio,
+                suma=suma,
+                conteo=conteo,
+                minimo=minimo,
+                maximo=maximo
+            )
+            for (granularidad, inicio), (suma, conteo, minimo, maximo) in totals.items()
+        ], using_db=connection)
+
+    return len(totals)
+
+
+async def main():
+    """Comando de backfill: python -m database.rollups"""
+    from database.conn import connectToDatabase
+
+    await connectToDatabase()
+    try:
+        for type_model in ROLLUP_MODELS:
+            total = await backfill(type_model)
+            logger.info(f"Agregados de {type_model._meta.db_table} reconstruidos: {total} filas")
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -4,14 +4,16 @@ import json
 
 class BPMModel(Model):
     id = fields.IntField(pk=True)
-    bpm = fields.IntField()
-    fecha = fields.DateField()
+    bpm = fields.FloatField()
+    fecha = fields.DatetimeField(index=True)
+    dispositivo = fields.CharField(max_length=64, null=True)
     
     class Meta:
         table = "bpm"
+        indexes = (("dispositivo", "fecha"),)
         
     def as_dict(self):
-        return { "id": self.id, "bpm": self.bpm, "fecha": self.fecha }
+        return { "id": self.id, "bpm": self.bpm, "fecha": self.fecha, "dispositivo": self.dispositivo }
     
     def as_json(self):
-        return json.dumps(self.as_dict())
\ No newline at end of file
+        return json.dumps(self.as_dict(), default=str)
\ No newline at end of file
@@ -0,0 +1,40 @@
+from tortoise import fields
+from tortoise.models import Model
+import json
+
+class RollupModel(Model):
+    """Agregados acumulados (suma, conteo, mínimo, máximo) de un periodo."""
+    id = fields.IntField(pk=True)
+    granularidad = fields.CharField(max_length=6)
+    inicio = fields.DateField()
+    suma = fields.FloatField()
+    conteo = fields.IntField()
+    minimo = fields.FloatField()
+    maximo = fields.FloatField()
+
+    class Meta:
+        abstract = True
+        unique_together = (("granularidad", "inicio"),)
+
+    def as_dict(self):
+        return {
+            "granularidad": self.granularidad,
+            "inicio": self.inicio,
+            "suma": self.suma,
+            "conteo": self.conteo,
+            "minimo": self.minimo,
+            "maximo": self.maximo
+        }
+
+    def as_json(self):
+        return json.dumps(self.as_dict(), default=str)
+
+class BPMRollupModel(RollupModel):
+    class Meta:
+        table = "bpm_rollups"
+        unique_together = (("granularidad", "inicio"),)
+
+class TempRollupModel(RollupModel):
+    class Meta:
+        table = "temperaturas_rollups"
+        unique_together = (("granularidad", "inicio"),)
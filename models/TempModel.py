@@ -4,14 +4,16 @@ import json
 
 class TempModel(Model):
     id = fields.IntField(pk=True)
-    temperatura = fields.IntField()
-    fecha = fields.DateField()
+    temperatura = fields.FloatField()
+    fecha = fields.DatetimeField(index=True)
+    dispositivo = fields.CharField(max_length=64, null=True)
     
     class Meta:
         table = "temperaturas"
+        indexes = (("dispositivo", "fecha"),)
         
     def as_dict(self):
-        return { "id": self.id, "temperatura": self.temperatura, "fecha": self.fecha }
+        return { "id": self.id, "temperatura": self.temperatura, "fecha": self.fecha, "dispositivo": self.dispositivo }
     
     def as_json(self):
-        return json.dumps(self.as_dict())
\ No newline at end of file
+        return json.dumps(self.as_dict(), default=str)
\ No newline at end of file
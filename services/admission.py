@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from services.metrics import DB_SHED, RATE_LIMITED
+
+load_dotenv()
+
+
+def _parse_rates(value: str) -> Dict[str, Tuple[float, float]]:
+    """Interpreta EVENT_RATES: 'insertBPMRecords=5/10,getTempRecords=2' (por segundo / ráfaga)."""
+    rates = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, spec = item.split("=", 1)
+            rate, _, burst = spec.partition("/")
+            rates[name.strip()] = (float(rate), float(burst or rate))
+    return rates
+
+
+class Overloaded(Exception):
+    """Se rechaza una solicitud para proteger al resto de los clientes."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Cubeta de fichas: `rate` solicitudes por segundo con ráfagas de hasta `burst`."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consume una ficha; retorna 0 si había, o los segundos hasta la próxima."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class ClientLimits:
+    """Límites de una conexión: una cubeta general y una por evento."""
+
+    __slots__ = ("policy", "connection", "events", "rejected_streak")
+
+    def __init__(self, policy: "AdmissionControl"):
+        self.policy = policy
+        self.connection = TokenBucket(policy.client_rate, policy.client_burst) if policy.client_rate > 0 else None
+        self.events: Dict[str, Optional[TokenBucket]] = {}
+        # Rechazos seguidos; al superar WS_MAX_REJECTIONS se cierra la conexión
+        self.rejected_streak = 0
+
+    def check(self, event: Optional[str], db: bool = False):
+        """Lanza Overloaded si la conexión o el evento superaron su tasa.
+
+        `event` es None para eventos no registrados: solo cuentan para la
+        cubeta de la conexión.
+        """
+        retry_after = self.connection.take() if self.connection is not None else 0.0
+        scope = "connection"
+        if not retry_after and event is not None:
+            bucket = self.events.get(event, False)
+            if bucket is False:
+                bucket = self.events[event] = self.policy.event_bucket(event, db)
+            if bucket is not None:
+                retry_after = bucket.take()
+                scope = "event"
+
+        if retry_after:
+            self.rejected_streak += 1
+            RATE_LIMITED.inc(scope=scope)
+            raise Overloaded("Demasiadas solicitudes", retry_after)
+        self.rejected_streak = 0
+
+    @property
+    def abusive(self) -> bool:
+        """True justo cuando los rechazos seguidos superan WS_MAX_REJECTIONS (una sola vez)."""
+        return self.policy.max_rejections > 0 and self.rejected_streak == self.policy.max_rejections + 1
+
+
+class AdmissionControl:
+    """Control de admisión del bridge, configurado con variables de entorno.
+
+    WS_RATE/WS_BURST limitan los mensajes por segundo de cada conexión;
+    EVENT_RATES fija tasas por evento y EVENT_RATE_DB/EVENT_BURST_DB
+    la de los eventos con base de datos que no aparecen ahí.
+    DB_MAX_CONCURRENCY acota las consultas en curso de todo el proceso y
+    DB_MAX_WAITING las que pueden esperar turno; por encima se responde
+    "ocupado" en lugar de encolar.
+    """
+
+    def __init__(self):
+        self.client_rate = float(os.getenv("WS_RATE", 20))
+        self.client_burst = float(os.getenv("WS_BURST", 40))
+        self.event_rates = _parse_rates(os.getenv("EVENT_RATES", ""))
+        self.db_event_rate = (float(os.getenv("EVENT_RATE_DB", 5)), float(os.getenv("EVENT_BURST_DB", 10)))
+        self.max_rejections = int(os.getenv("WS_MAX_REJECTIONS", 100))
+        self.max_clients = int(os.getenv("WS_MAX_CLIENTS", 10000))
+
+        self.db_concurrency = int(os.getenv("DB_MAX_CONCURRENCY", os.getenv("DB_POOL_MAX", 10)))
+        self.db_max_waiting = int(os.getenv("DB_MAX_WAITING", 100))
+        self._db_slots = asyncio.Semaphore(self.db_concurrency)
+        self.db_active = 0
+        self.db_waiting = 0
+
+    def client(self) -> ClientLimits:
+        return ClientLimits(self)
+
+    def event_bucket(self, event: str, db: bool) -> Optional[TokenBucket]:
+        rate, burst = self.event_rates.get(event, self.db_event_rate if db else (0, 0))
+        return TokenBucket(rate, burst) if rate > 0 else None
+
+    async def acquire_db(self):
+        """Toma un turno de base de datos; lanza Overloaded si la espera ya está llena."""
+        if self._db_slots.locked() and self.db_waiting >= self.db_max_waiting:
+            DB_SHED.inc()
+            raise Overloaded("Servidor ocupado", 1.0)
+        self.db_waiting += 1
+        try:
+            await self._db_slots.acquire()
+        finally:
+            self.db_waiting -= 1
+        self.db_active += 1
+
+    def release_db(self):
+        self.db_active -= 1
+        self._db_slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "dbActive": self.db_active,
+            "dbWaiting": self.db_waiting,
+            "dbConcurrency": self.db_concurrency
+        }
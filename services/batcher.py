@@ -0,0 +1,88 @@
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional, Set
+
+from dotenv import load_dotenv
+from services.frames import Frame
+
+load_dotenv()
+
+
+class MessageBatcher:
+    """Acumula tramas MQTT y las entrega en lotes cada N mensajes o T milisegundos.
+
+    Los tópicos configurados para conflación conservan solo su último valor
+    dentro de cada lote, en la posición en que llegó el primero.
+    """
+
+    def __init__(
+        self,
+        on_flush: Callable[[List[Frame]], None],
+        max_messages: int = None,
+        window_ms: float = None,
+        conflate_topics: Set[str] = None
+    ):
+        self.on_flush = on_flush
+        self.max_messages = max_messages or int(os.getenv("BATCH_MAX_MESSAGES", 1))
+        self.window = (window_ms if window_ms is not None else float(os.getenv("BATCH_WINDOW_MS", 0))) / 1000
+        if conflate_topics is None:
+            conflate_topics = {
+                topic.strip()
+                for topic in os.getenv("BATCH_CONFLATE_TOPICS", "sensor/distancia").split(",")
+                if topic.strip()
+            }
+        self.conflate_topics = conflate_topics
+
+        self._pending: List[Frame] = []
+        self._conflated: Dict[str, int] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Contadores
+        self.batches = 0
+        self.messages = 0
+        self.conflated = 0
+
+    @property
+    def enabled(self) -> bool:
+        """El agrupamiento solo se activa con más de un mensaje por lote y una ventana."""
+        return self.max_messages > 1 and self.window > 0
+
+    def add(self, frame: Frame):
+        """Agrega una trama al lote actual; debe llamarse desde el event loop."""
+        if frame.topic in self.conflate_topics:
+            index = self._conflated.get(frame.topic)
+            if index is not None:
+                self._pending[index] = frame
+                self.conflated += 1
+                return
+            self._conflated[frame.topic] = len(self._pending)
+
+        self._pending.append(frame)
+        if len(self._pending) >= self.max_messages:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self):
+        """Entrega el lote pendiente, si lo hay."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if not self._pending:
+            return
+
+        frames = self._pending
+        self._pending = []
+        self._conflated = {}
+        self.batches += 1
+        self.messages += len(frames)
+        self.on_flush(frames)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "batches": self.batches,
+            "messages": self.messages,
+            "conflated": self.conflated,
+            "pending": len(self._pending)
+        }
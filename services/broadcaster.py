@@ -0,0 +1,324 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+import websockets
+from loguru import logger
+from dotenv import load_dotenv
+from services.frames import TEXT, BatchFrame, Frame
+from services.metrics import MESSAGES_DROPPED, MESSAGES_SENT, SEND_LATENCY, SLOW_CONSUMERS
+from services.topicTrie import TopicTrie
+
+load_dotenv()
+
+# Políticas de desbordamiento de la cola de salida de cada cliente
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DROP_NEWEST, DISCONNECT)
+
+# Código de cierre WebSocket "Try Again Later" para consumidores lentos
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ClientSession:
+    """Cola de salida acotada y tarea escritora de un cliente WebSocket."""
+
+    def __init__(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        max_queue: int,
+        overflow_policy: str,
+        on_close: Callable[["ClientSession"], None],
+        frame_format: str = TEXT
+    ):
+        self.websocket = websocket
+        self.frame_format = frame_format
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.queue: deque = deque()
+        self.subscriptions: Set[str] = set()
+        self.default_subscriptions = True
+        self.closed = False
+
+        # Contadores de retraso por cliente
+        self.sent = 0
+        self.dropped = 0
+        self.max_lag = 0
+
+        self._on_close = on_close
+        self._wakeup = asyncio.Event()
+        # Activo mientras la cola está vacía y no hay un envío en curso
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    @property
+    def lag(self) -> int:
+        """Mensajes pendientes de enviar al cliente."""
+        return len(self.queue)
+
+    def enqueue(self, message: Any) -> bool:
+        """Encola un mensaje sin bloquear; aplica la política de desbordamiento."""
+        if self.closed:
+            return False
+
+        if len(self.queue) >= self.max_queue:
+            self.dropped += 1
+            MESSAGES_DROPPED.inc(policy=self.overflow_policy)
+            if self.overflow_policy == DROP_NEWEST:
+                return False
+            if self.overflow_policy == DISCONNECT:
+                self._disconnect_slow_consumer()
+                return False
+            self.queue.popleft()
+
+        self.queue.append(message)
+        if len(self.queue) > self.max_lag:
+            self.max_lag = len(self.queue)
+        self._idle.clear()
+        self._wakeup.set()
+        return True
+
+    async def _write_loop(self):
+        """Envía los mensajes de la cola al socket, uno tras otro."""
+        try:
+            while True:
+                if not self.queue:
+                    self._idle.set()
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                message = self.queue.popleft()
+                if isinstance(message, (Frame, BatchFrame)):
+                    message = message.payload_for(self.frame_format)
+                with SEND_LATENCY.time():
+                    await self.websocket.send(message)
+                self.sent += 1
+                MESSAGES_SENT.inc()
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error(f"Error enviando mensaje a cliente: {e}")
+        finally:
+            self.closed = True
+            self.queue.clear()
+            self._idle.set()
+            self._on_close(self)
+
+    def _disconnect_slow_consumer(self):
+        """Desconecta a un cliente que no consume sus mensajes a tiempo."""
+        logger.warning(
+            f"Cliente lento desconectado: {self.dropped} mensajes descartados"
+        )
+        SLOW_CONSUMERS.inc()
+        self.close()
+        asyncio.create_task(self.websocket.close(
+            code=SLOW_CONSUMER_CLOSE_CODE,
+            reason="Cliente demasiado lento"
+        ))
+
+    async def drain(self):
+        """Espera a que se envíen todos los mensajes encolados."""
+        await self._idle.wait()
+
+    def close(self):
+        """Detiene la tarea escritora y descarta los mensajes pendientes."""
+        self.closed = True
+        self.queue.clear()
+        self._writer.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "lag": self.lag,
+            "maxLag": self.max_lag,
+            "sent": self.sent,
+            "dropped": self.dropped
+        }
+
+
+class Broadcaster:
+    """Difunde mensajes a los clientes a través de sus colas individuales."""
+
+    def __init__(self, max_queue: int = None, overflow_policy: str = None):
+        self.max_queue = max_queue or int(os.getenv("BROADCAST_QUEUE_SIZE", 256))
+        self.overflow_policy = overflow_policy or os.getenv(
+            "BROADCAST_OVERFLOW_POLICY", DROP_OLDEST
+        )
+        if self.overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Política de desbordamiento inválida: {self.overflow_policy}"
+            )
+
+        # Filtros con los que arranca cada cliente hasta que elige los suyos
+        self.default_subscriptions = [
+            topic.strip()
+            for topic in os.getenv("WS_DEFAULT_SUBSCRIPTIONS", "#").split(",")
+            if topic.strip()
+        ]
+
+        self.sessions: Dict[websockets.WebSocketServerProtocol, ClientSession] = {}
+        self.topics = TopicTrie()
+
+    def register(self, websocket: websockets.WebSocketServerProtocol, frame_format: str = TEXT) -> ClientSession:
+        """Crea la sesión (cola y tarea escritora) de un cliente nuevo."""
+        session = ClientSession(
+            websocket,
+            self.max_queue,
+            self.overflow_policy,
+            self._on_session_closed,
+            frame_format
+        )
+        self.sessions[websocket] = session
+        for pattern in self.default_subscriptions:
+            self._add_subscription(session, pattern)
+        return session
+
+    def unregister(self, websocket: websockets.WebSocketServerProtocol):
+        """Elimina la sesión de un cliente y detiene su tarea escritora."""
+        session = self.sessions.pop(websocket, None)
+        if session is not None:
+            self._clear_subscriptions(session)
+            session.close()
+
+    def _on_session_closed(self, session: ClientSession):
+        if self.sessions.get(session.websocket) is session:
+            del self.sessions[session.websocket]
+            self._clear_subscriptions(session)
+
+    def subscribe(
+        self,
+        websocket: websockets.WebSocketServerProtocol,
+        patterns: Iterable[str],
+        replace_defaults: bool = True
+    ) -> List[str]:
+        """Suscribe al cliente a los filtros dados.
+
+        La primera suscripción explícita reemplaza a las suscripciones por
+        defecto, de modo que el cliente solo recibe lo que pidió.
+        """
+        session = self.sessions.get(websocket)
+        if session is None:
+            return []
+        if session.default_subscriptions and replace_defaults:
+            self._drop_defaults(session)
+
+        for pattern in patterns:
+            self._add_subscription(session, pattern)
+        return sorted(session.subscriptions)
+
+    def unsubscribe(self, websocket: websockets.WebSocketServerProtocol, patterns: Iterable[str]) -> List[str]:
+        """Cancela las suscripciones del cliente a los filtros dados."""
+        session = self.sessions.get(websocket)
+        if session is None:
+            return []
+        removed_default = False
+        for pattern in patterns:
+            if self.topics.unsubscribe(pattern, session):
+                session.subscriptions.discard(pattern)
+                removed_default = removed_default or pattern in self.default_subscriptions
+
+        # Quitar un filtro por defecto deja al cliente solo con lo que pidió explícitamente
+        if session.default_subscriptions and removed_default:
+            self._drop_defaults(session)
+        return sorted(session.subscriptions)
+
+    def _drop_defaults(self, session: ClientSession):
+        """Quita los filtros por defecto; conserva los pedidos explícitamente (p. ej. $stats)."""
+        for pattern in self.default_subscriptions:
+            if self.topics.unsubscribe(pattern, session):
+                session.subscriptions.discard(pattern)
+        session.default_subscriptions = False
+
+    def _add_subscription(self, session: ClientSession, pattern: str):
+        if self.topics.subscribe(pattern, session):
+            session.subscriptions.add(pattern)
+
+    def _clear_subscriptions(self, session: ClientSession):
+        for pattern in session.subscriptions:
+            self.topics.unsubscribe(pattern, session)
+        session.subscriptions.clear()
+
+    def publish(self, topic: str, message: Any) -> int:
+        """Encola el mensaje solo para los clientes suscritos al tópico."""
+        delivered = 0
+        for session in self.topics.match(topic):
+            if session.enqueue(message):
+                delivered += 1
+        return delivered
+
+    def publish_batch(self, frames: List[Frame]) -> int:
+        """Entrega a cada cliente, en un solo arreglo, las tramas que le corresponden.
+
+        Los clientes que reciben exactamente las mismas tramas comparten el
+        mismo objeto BatchFrame, de modo que cada combinación se codifica una vez.
+        """
+        routes: Dict[str, Set[ClientSession]] = {}
+        per_session: Dict[ClientSession, List[int]] = {}
+        for index, frame in enumerate(frames):
+            sessions = routes.get(frame.topic)
+            if sessions is None:
+                sessions = routes[frame.topic] = self.topics.match(frame.topic)
+            for session in sessions:
+                per_session.setdefault(session, []).append(index)
+
+        batches: Dict[tuple, BatchFrame] = {}
+        delivered = 0
+        for session, indices in per_session.items():
+            key = tuple(indices)
+            batch = batches.get(key)
+            if batch is None:
+                batch = batches[key] = BatchFrame([frames[index] for index in indices])
+            if session.enqueue(batch):
+                delivered += 1
+        return delivered
+
+    def broadcast(self, message: Any) -> int:
+        """Encola el mensaje para todos los clientes; retorna cuántos lo aceptaron."""
+        delivered = 0
+        for session in list(self.sessions.values()):
+            if session.enqueue(message):
+                delivered += 1
+        return delivered
+
+    async def shutdown(self, code: int, reason: str, notice: Callable[[], Any] = None, timeout: float = 5):
+        """Cierra todas las sesiones en paralelo sin descartar lo que ya estaba encolado.
+
+        A cada cliente se le encola `notice()` detrás de sus mensajes
+        pendientes; cuando su cola se vacía se cierra el socket con `code`.
+        Las conexiones que no terminan en `timeout` segundos se abortan.
+        """
+        sessions = list(self.sessions.values())
+        if not sessions:
+            return
+
+        async def close(session: ClientSession):
+            if notice is not None:
+                session.enqueue(notice())
+            await session.drain()
+            self.unregister(session.websocket)
+            await session.websocket.close(code=code, reason=reason)
+
+        tasks = [asyncio.create_task(close(session)) for session in sessions]
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        for session in sessions:
+            self.unregister(session.websocket)
+            if not session.websocket.closed:
+                session.websocket.transport.abort()
+        if pending:
+            logger.warning(f"{len(pending)} clientes no cerraron a tiempo; conexiones abortadas")
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna los contadores de retraso de todos los clientes."""
+        clients = [session.stats() for session in self.sessions.values()]
+        return {
+            "clients": len(clients),
+            "lag": sum(client["lag"] for client in clients),
+            "maxLag": max((client["maxLag"] for client in clients), default=0),
+            "dropped": sum(client["dropped"] for client in clients),
+            "sent": sum(client["sent"] for client in clients)
+        }
@@ -0,0 +1,230 @@
+import asyncio
+import os
+import socket
+import struct
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Roles de un proceso del bridge
+STANDALONE = "standalone"  # MQTT y WebSocket en un solo proceso (por defecto)
+INGEST = "ingest"          # Único suscriptor MQTT; persiste y difunde por el bus
+WORKER = "worker"          # Atiende WebSockets con SO_REUSEPORT; recibe los mensajes del bus
+
+# Tipos de trama del bus
+MESSAGE = 1  # Mensaje MQTT ya validado: tópico + sobre JSON
+FLUSH = 2    # Lote escrito: tipo de lectura + filas, para invalidar cachés y estadísticas en vivo
+STATS = 3    # Contadores de un nodo: id del nodo + JSON
+
+# Tipo (1 byte), largo del tópico (2 bytes), largo del cuerpo (4 bytes)
+_HEADER = struct.Struct(">BHI")
+
+Handler = Callable[[int, str, bytes], None]
+
+
+def node_id(role: str) -> str:
+    """Identificador del proceso en el clúster (CLUSTER_NODE_ID o host-pid)."""
+    return os.getenv("CLUSTER_NODE_ID") or f"{role}-{socket.gethostname()}-{os.getpid()}"
+
+
+def bus_address(url: str = None) -> Tuple[Any, ...]:
+    """Interpreta CLUSTER_BUS: unix:///ruta/al.sock (un host) o tcp://host:puerto (varios hosts)."""
+    parsed = urlparse(url or os.getenv("CLUSTER_BUS", "unix:///tmp/vitalguard-bus.sock"))
+    if parsed.scheme == "unix":
+        return ("unix", parsed.path)
+    if parsed.scheme == "tcp":
+        return ("tcp", parsed.hostname or "localhost", parsed.port or 8770)
+    raise ValueError(f"Dirección de bus inválida: {url}")
+
+
+def encode(kind: int, topic: str, body: bytes) -> bytes:
+    topic_bytes = topic.encode()
+    return _HEADER.pack(kind, len(topic_bytes), len(body)) + topic_bytes + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, str, bytes, bytes]:
+    """Lee una trama del bus; retorna (tipo, tópico, cuerpo, bytes crudos)."""
+    header = await reader.readexactly(_HEADER.size)
+    kind, topic_size, body_size = _HEADER.unpack(header)
+    payload = await reader.readexactly(topic_size + body_size)
+    return kind, payload[:topic_size].decode(), payload[topic_size:], header + payload
+
+
+class BusHub:
+    """Concentrador del bus, corre en el nodo de ingesta.
+
+    Retransmite cada trama recibida de un nodo a todos los demás y entrega
+    las suyas a todos. Un nodo cuyo buffer de salida supera CLUSTER_BUS_BUFFER
+    bytes pierde tramas en lugar de frenar al resto.
+    """
+
+    def __init__(self, on_message: Handler, address: Tuple[Any, ...] = None, max_buffer: int = None):
+        self.on_message = on_message
+        self.address = address or bus_address()
+        self.max_buffer = max_buffer or int(os.getenv("CLUSTER_BUS_BUFFER", 4 * 1024 * 1024))
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._peers: Dict[asyncio.StreamWriter, None] = {}
+
+        self.relayed = 0
+        self.dropped = 0
+
+    async def start(self):
+        if self.address[0] == "unix":
+            if os.path.exists(self.address[1]):
+                os.unlink(self.address[1])
+            self._server = await asyncio.start_unix_server(self._handle, self.address[1])
+        else:
+            self._server = await asyncio.start_server(self._handle, self.address[1], self.address[2])
+        logger.info(f"Bus del clúster escuchando en {self.address}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._peers[writer] = None
+        logger.info(f"Nodo conectado al bus ({len(self._peers)} nodos)")
+        try:
+            while True:
+                kind, topic, body, raw = await read_frame(reader)
+                self._relay(raw, exclude=writer)
+                self.on_message(kind, topic, body)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Error en el bus del clúster: {e}")
+        finally:
+            self._peers.pop(writer, None)
+            writer.close()
+            logger.info(f"Nodo desconectado del bus ({len(self._peers)} nodos)")
+
+    def _relay(self, data: bytes, exclude: asyncio.StreamWriter = None):
+        for peer in self._peers:
+            if peer is exclude:
+                continue
+            if peer.transport.get_write_buffer_size() > self.max_buffer:
+                self.dropped += 1
+                continue
+            peer.write(data)
+            self.relayed += 1
+
+    def publish(self, kind: int, topic: str, body: bytes):
+        """Envía una trama a todos los nodos conectados."""
+        if self._peers:
+            self._relay(encode(kind, topic, body))
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for peer in list(self._peers):
+            peer.close()
+        if self.address[0] == "unix" and os.path.exists(self.address[1]):
+            os.unlink(self.address[1])
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "peers": len(self._peers),
+            "relayed": self.relayed,
+            "dropped": self.dropped
+        }
+
+
+class BusClient:
+    """Conexión de un worker al bus, con reconexión automática."""
+
+    def __init__(self, on_message: Handler, address: Tuple[Any, ...] = None, reconnect_interval: float = None, max_buffer: int = None):
+        self.on_message = on_message
+        self.address = address or bus_address()
+        self.reconnect_interval = reconnect_interval or float(os.getenv("CLUSTER_RECONNECT_INTERVAL", 1))
+        self.max_buffer = max_buffer or int(os.getenv("CLUSTER_BUS_BUFFER", 4 * 1024 * 1024))
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+        self.received = 0
+        self.dropped = 0
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self.address[0] == "unix":
+            return await asyncio.open_unix_connection(self.address[1])
+        return await asyncio.open_connection(self.address[1], self.address[2])
+
+    async def run(self):
+        """Lee tramas del bus hasta ser cancelado, reconectando si el concentrador se cae."""
+        while True:
+            try:
+                reader, self._writer = await self._connect()
+                logger.info(f"Conectado al bus del clúster en {self.address}")
+                while True:
+                    kind, topic, body, _ = await read_frame(reader)
+                    self.received += 1
+                    self.on_message(kind, topic, body)
+            except asyncio.CancelledError:
+                raise
+            except (OSError, asyncio.IncompleteReadError) as e:
+                logger.warning(f"Bus del clúster no disponible, reintentando en {self.reconnect_interval}s: {e}")
+            except Exception as e:
+                logger.error(f"Error en el bus del clúster: {e}")
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+            await asyncio.sleep(self.reconnect_interval)
+
+    def publish(self, kind: int, topic: str, body: bytes):
+        """Envía una trama al concentrador; se descarta si no hay conexión."""
+        if self._writer is None or self._writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.dropped += 1
+            return
+        self._writer.write(encode(kind, topic, body))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "connected": int(self._writer is not None),
+            "received": self.received,
+            "dropped": self.dropped
+        }
+
+
+def aggregate_stats(snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Suma los contadores de todos los nodos; los campos max* y highWater toman el máximo."""
+    total: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        for section, values in snapshot.items():
+            if not isinstance(values, dict):
+                continue
+            merged = total.setdefault(section, {})
+            for name, value in values.items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                if name.startswith("max") or name == "highWater":
+                    merged[name] = max(merged.get(name, value), value)
+                else:
+                    merged[name] = merged.get(name, 0) + value
+    return total
+
+
+def run_cluster(target: Callable[[str, str], None], workers: int):
+    """Corre el nodo de ingesta en este proceso y `workers` procesos worker.
+
+    `target(role, node_id)` arranca un nodo; debe ser una función de nivel
+    de módulo para poder iniciarse con multiprocessing (spawn).
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=target, args=(WORKER, f"worker-{index}"), name=f"bridge-worker-{index}", daemon=True)
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    logger.info(f"{workers} workers iniciados")
+
+    try:
+        target(INGEST, "ingest")
+    finally:
+        # SIGTERM: cada worker cierra sus clientes de forma ordenada dentro de SHUTDOWN_TIMEOUT
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=float(os.getenv("SHUTDOWN_TIMEOUT", 10)) + 5)
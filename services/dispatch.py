@@ -0,0 +1,72 @@
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# handler(bridge, websocket, parsed_data) -> respuesta
+Handler = Callable[[Any, Any, Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]]
+
+
+def _parse_timeouts(value: str) -> Dict[str, float]:
+    """Interpreta EVENT_TIMEOUTS: 'getBPMRecords=10,insertBPMRecords=5'."""
+    timeouts = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
+
+class EventHandler:
+    __slots__ = ("name", "function", "timeout", "db")
+
+    def __init__(self, name: str, function: Handler, timeout: Optional[float], db: bool = False):
+        self.name = name
+        self.function = function
+        self.timeout = timeout
+        # True si el evento consulta o escribe en la base de datos
+        self.db = db
+
+
+class EventRegistry:
+    """Registro de los eventos WebSocket, armado una sola vez al importar los módulos.
+
+    Cada evento tiene un tiempo máximo: el indicado al registrarlo, el de
+    EVENT_TIMEOUTS o, si no, EVENT_TIMEOUT (30 s por defecto).
+    """
+
+    def __init__(self, default_timeout: float = None):
+        self.default_timeout = default_timeout or float(os.getenv("EVENT_TIMEOUT", 30))
+        self.overrides = _parse_timeouts(os.getenv("EVENT_TIMEOUTS", ""))
+        self._handlers: Dict[str, EventHandler] = {}
+
+    def event(self, name: str, timeout: float = None, db: bool = False) -> Callable[[Handler], Handler]:
+        """Decorador que registra la función como manejador del evento.
+
+        db=True marca los eventos que usan la base de datos.
+        """
+        def decorator(function: Handler) -> Handler:
+            self.add(name, function, timeout, db)
+            return function
+        return decorator
+
+    def add(self, name: str, function: Handler, timeout: float = None, db: bool = False):
+        if name in self._handlers:
+            raise ValueError(f"Evento duplicado: {name}")
+        self._handlers[name] = EventHandler(
+            name,
+            function,
+            self.overrides.get(name, timeout if timeout is not None else self.default_timeout),
+            db
+        )
+
+    def get(self, name: Any) -> Optional[EventHandler]:
+        return self._handlers.get(name) if isinstance(name, str) else None
+
+    def names(self):
+        return list(self._handlers)
+
+
+handlers = EventRegistry()
@@ -0,0 +1,163 @@
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from loguru import logger
+from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+load_dotenv()
+
+# Formatos de trama que un cliente puede negociar al conectarse
+TEXT = "json"
+BINARY = "msgpack"
+
+
+class JSONBackend:
+    """Par loads/dumps intercambiable para el camino caliente de las tramas."""
+
+    def __init__(self, name: str, loads: Callable[[str], Any], dumps: Callable[[Any], str]):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+
+JSON_BACKENDS: Dict[str, JSONBackend] = {
+    "json": JSONBackend("json", json.loads, json.dumps)
+}
+
+if orjson is not None:
+    JSON_BACKENDS["orjson"] = JSONBackend(
+        "orjson",
+        orjson.loads,
+        lambda data: orjson.dumps(data).decode()
+    )
+
+
+def register_json_backend(name: str, loads: Callable[[str], Any], dumps: Callable[[Any], str]):
+    """Registra un backend JSON adicional (p. ej. ujson, simdjson)."""
+    JSON_BACKENDS[name] = JSONBackend(name, loads, dumps)
+
+
+def get_json_backend(name: str = None) -> JSONBackend:
+    """Retorna el backend pedido o, en modo 'auto', el más rápido instalado."""
+    name = name or os.getenv("JSON_BACKEND", "auto")
+    if name == "auto":
+        return JSON_BACKENDS.get("orjson", JSON_BACKENDS["json"])
+    if name not in JSON_BACKENDS:
+        logger.warning(f"Backend JSON '{name}' no disponible, se usa 'json'")
+        return JSON_BACKENDS["json"]
+    return JSON_BACKENDS[name]
+
+
+def negotiate_format(path: Optional[str]) -> str:
+    """Obtiene el formato de trama pedido en la URL de conexión (?format=msgpack)."""
+    if not path:
+        return TEXT
+
+    requested = parse_qs(urlparse(path).query).get("format", [TEXT])[0].lower()
+    if requested != BINARY:
+        return TEXT
+    if msgpack is None:
+        logger.warning("Formato msgpack solicitado pero msgpack no está instalado")
+        return TEXT
+    return BINARY
+
+
+class Frame:
+    """Mensaje MQTT codificado una sola vez y compartido por todos los destinatarios.
+
+    El texto JSON se arma al recibir el mensaje; la versión MessagePack se
+    genera solo la primera vez que algún cliente binario la necesita.
+    """
+
+    __slots__ = ("topic", "data", "received", "_text", "_binary", "_backend")
+
+    def __init__(self, topic: str, data: Any, text: str = None, backend: JSONBackend = None):
+        self.topic = topic
+        self.data = data
+        # Momento de recepción (perf_counter), para medir la latencia hasta la difusión
+        self.received = time.perf_counter()
+        self._text = text
+        self._binary = None
+        self._backend = backend or get_json_backend()
+
+    def envelope(self) -> Dict[str, Any]:
+        return {"topic": self.topic, "parsedData": self.data}
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self._backend.dumps(self.envelope())
+        return self._text
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = msgpack.packb(self.envelope())
+        return self._binary
+
+    def payload_for(self, frame_format: str):
+        """Retorna la codificación de la trama para el formato del cliente."""
+        return self.binary if frame_format == BINARY else self.text
+
+
+class BatchFrame:
+    """Varias tramas agrupadas en un único arreglo JSON o MessagePack."""
+
+    __slots__ = ("frames", "_text", "_binary")
+
+    def __init__(self, frames: List[Frame]):
+        self.frames = frames
+        self._text = None
+        self._binary = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = "[" + ", ".join(frame.text for frame in self.frames) + "]"
+        return self._text
+
+    @property
+    def binary(self) -> bytes:
+        if self._binary is None:
+            self._binary = msgpack.packb([frame.envelope() for frame in self.frames])
+        return self._binary
+
+    def payload_for(self, frame_format: str):
+        return self.binary if frame_format == BINARY else self.text
+
+
+class FrameEncoder:
+    """Construye tramas empalmando el payload crudo en un sobre precalculado."""
+
+    def __init__(self, backend: JSONBackend = None):
+        self.backend = backend or get_json_backend()
+        self._prefixes: Dict[str, str] = {}
+
+    def _prefix(self, topic: str) -> str:
+        prefix = self._prefixes.get(topic)
+        if prefix is None:
+            prefix = '{"topic": ' + json.dumps(topic) + ', "parsedData": '
+            self._prefixes[topic] = prefix
+        return prefix
+
+    def build(self, topic: str, payload: bytes) -> Frame:
+        """Valida el payload JSON y arma la trama sin volver a serializarlo.
+
+        Lanza ValueError si el payload no es UTF-8 o JSON válido.
+        """
+        raw = payload.decode().strip()
+        data = self.backend.loads(raw)
+        return Frame(topic, data, self._prefix(topic) + raw + "}", self.backend)
@@ -0,0 +1,129 @@
+import os
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from dotenv import load_dotenv
+
+from services.readings import extract_value
+
+load_dotenv()
+
+
+class RingBuffer:
+    """Últimas `capacity` lecturas de un tópico en dos arreglos de doubles (8 bytes por campo).
+
+    Agregar una lectura es O(1) y no crea objetos por lectura.
+    """
+
+    __slots__ = ("capacity", "times", "values", "head", "size")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0  # Posición de la próxima escritura
+        self.size = 0
+
+    def append(self, value: float, timestamp: float):
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+
+    def _indexes(self, count: int) -> Iterable[int]:
+        start = (self.head - count) % self.capacity
+        return (
+            (start + offset) % self.capacity
+            for offset in range(count)
+        )
+
+    def last(self, samples: int = None, since: float = None) -> Tuple[List[float], List[float]]:
+        """Retorna (marcas de tiempo, valores) de la más antigua a la más reciente.
+
+        `samples` limita la cantidad de lecturas y `since` descarta las
+        anteriores a esa marca de tiempo (epoch en segundos).
+        """
+        count = self.size if samples is None else max(0, min(samples, self.size))
+        if since is not None:
+            # Las marcas son crecientes: basta con contar desde la más reciente
+            recent = 0
+            for index in self._indexes(count):
+                if self.times[index] >= since:
+                    break
+                recent += 1
+            count -= recent
+
+        indexes = list(self._indexes(count))
+        return [self.times[i] for i in indexes], [self.values[i] for i in indexes]
+
+
+class ReadingHistory:
+    """Historial en memoria de las lecturas numéricas más recientes por tópico.
+
+    Solo se guardan los tópicos de HISTORY_TOPICS, cada uno con
+    HISTORY_SIZE lecturas. Sirve para que un panel se dibuje al conectarse
+    sin consultar la base de datos.
+    """
+
+    def __init__(self, topics: Iterable[str] = None, capacity: int = None):
+        if topics is None:
+            topics = os.getenv("HISTORY_TOPICS", "sensor/bpm,sensor/temperatura,sensor/distancia").split(",")
+        self.capacity = capacity or int(os.getenv("HISTORY_SIZE", 3600))
+        self.buffers: Dict[str, RingBuffer] = {
+            topic.strip(): RingBuffer(self.capacity)
+            for topic in topics if topic.strip()
+        }
+
+    def record(self, topic: str, data: Any, timestamp: float = None) -> bool:
+        """Guarda la lectura si el tópico tiene historial y el payload es numérico."""
+        buffer = self.buffers.get(topic)
+        if buffer is None:
+            return False
+
+        value = extract_value(data, topic.rsplit("/", 1)[-1])
+        if value is None:
+            return False
+
+        buffer.append(value, time.time() if timestamp is None else timestamp)
+        return True
+
+    def recent(self, topics: Iterable[str] = None, samples: int = None, seconds: float = None) -> Dict[str, Dict[str, List[float]]]:
+        """Lecturas recientes por tópico en formato columnar {'fechas': [...], 'valores': [...]}."""
+        since = time.time() - seconds if seconds is not None else None
+        result = {}
+        for topic in (self.buffers if topics is None else topics):
+            buffer = self.buffers.get(topic)
+            if buffer is None:
+                continue
+            fechas, valores = buffer.last(samples, since)
+            result[topic] = {'fechas': fechas, 'valores': valores}
+        return result
+
+
+def replay_request(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Obtiene el historial pedido en la URL de conexión (?history=100 o ?historySeconds=60).
+
+    `historyTopics` limita los tópicos (separados por comas). Retorna None
+    si no se pidió historial.
+    """
+    if not path:
+        return None
+
+    query = parse_qs(urlparse(path).query)
+    samples = query.get("history", [None])[0]
+    seconds = query.get("historySeconds", [None])[0]
+    if samples is None and seconds is None:
+        return None
+
+    topics = query.get("historyTopics", [None])[0]
+    try:
+        return {
+            'samples': int(samples) if samples is not None else None,
+            'seconds': float(seconds) if seconds is not None else None,
+            'topics': topics.split(",") if topics else None
+        }
+    except ValueError:
+        return None
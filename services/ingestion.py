@@ -0,0 +1,163 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Políticas cuando el buffer de ingesta está lleno
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+
+
+class IngestBuffer:
+    """Buffer acotado entre el hilo de red MQTT y el event loop.
+
+    No usa locks: el productor solo hace append sobre un deque (atómico) y
+    programa un único drenado mientras no haya otro pendiente, así que una
+    ráfaga de mensajes cuesta una sola llamada a call_soon_threadsafe.
+    """
+
+    def __init__(
+        self,
+        consumer: Callable[[Any], None],
+        max_size: int = None,
+        overflow_policy: str = None,
+        drain_limit: int = None
+    ):
+        self.consumer = consumer
+        self.max_size = max_size or int(os.getenv("INGEST_BUFFER_SIZE", 10000))
+        self.overflow_policy = overflow_policy or os.getenv("INGEST_OVERFLOW_POLICY", DROP_OLDEST)
+        if self.overflow_policy not in (DROP_OLDEST, DROP_NEWEST):
+            raise ValueError(f"Política de desbordamiento inválida: {self.overflow_policy}")
+        # Máximo de elementos por drenado antes de ceder el event loop
+        self.drain_limit = drain_limit or int(os.getenv("INGEST_DRAIN_LIMIT", 1000))
+
+        self._items: deque = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._drain_scheduled = False
+
+        # Métricas de contrapresión
+        self.received = 0
+        self.dropped = 0
+        self.drained = 0
+        self.wakeups = 0
+        self.high_water = 0
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """Asocia el buffer al event loop que consumirá los mensajes."""
+        self._loop = loop
+        if self._items:
+            self._schedule_drain()
+
+    def put(self, item: Any) -> bool:
+        """Agrega un elemento desde cualquier hilo; retorna False si se descartó."""
+        if len(self._items) >= self.max_size:
+            self.dropped += 1
+            if self.overflow_policy == DROP_NEWEST:
+                return False
+            try:
+                self._items.popleft()
+            except IndexError:
+                pass
+
+        self._items.append(item)
+        self.received += 1
+        if len(self._items) > self.high_water:
+            self.high_water = len(self._items)
+
+        if not self._drain_scheduled:
+            self._schedule_drain()
+        return True
+
+    def _schedule_drain(self):
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._drain_scheduled = True
+        self._loop.call_soon_threadsafe(self._drain)
+
+    def _drain(self):
+        """Entrega los elementos pendientes al consumidor dentro del event loop."""
+        # Se baja la bandera antes de leer: lo que llegue después programa otro drenado
+        self._drain_scheduled = False
+        self.wakeups += 1
+
+        for _ in range(self.drain_limit):
+            try:
+                item = self._items.popleft()
+            except IndexError:
+                return
+
+            self.drained += 1
+            try:
+                self.consumer(item)
+            except Exception as e:
+                logger.error(f"Error procesando cola de mensajes: {e}")
+
+        # Quedan elementos: ceder el loop y continuar en la siguiente iteración
+        if self._items and not self._drain_scheduled:
+            self._drain_scheduled = True
+            self._loop.call_soon(self._drain)
+
+    def flush(self):
+        """Entrega de inmediato todo lo pendiente, sin ceder el loop (al detener el servicio)."""
+        while self._items:
+            self._drain()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def depth(self) -> int:
+        """Elementos pendientes de drenar."""
+        return len(self._items)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth,
+            "highWater": self.high_water,
+            "received": self.received,
+            "dropped": self.dropped,
+            "drained": self.drained,
+            "wakeups": self.wakeups
+        }
+
+
+class AsyncMQTTSource:
+    """Cliente MQTT nativo de asyncio (aiomqtt) que corre en el event loop, sin hilo extra."""
+
+    def __init__(
+        self,
+        topics: Iterable[str],
+        on_message: Callable[[str, bytes], None],
+        reconnect_interval: float = None
+    ):
+        self.topics = list(topics)
+        self.on_message = on_message
+        self.reconnect_interval = reconnect_interval or float(os.getenv("MQTT_RECONNECT_INTERVAL", 5))
+
+    async def run(self):
+        """Mantiene la conexión con el broker y entrega cada mensaje recibido."""
+        import aiomqtt
+
+        while True:
+            try:
+                async with aiomqtt.Client(
+                    hostname=os.getenv("MQTT_BROKER", "localhost"),
+                    port=int(os.getenv("MQTT_PORT", 1883)),
+                    username=os.getenv("MQTT_USERNAME", "polter"),
+                    password=os.getenv("MQTT_PASSWORD", "123"),
+                    keepalive=60
+                ) as client:
+                    logger.info("Conectado al broker MQTT")
+                    for topic in self.topics:
+                        await client.subscribe(topic)
+
+                    async for message in client.messages:
+                        self.on_message(str(message.topic), message.payload)
+            except aiomqtt.MqttError as e:
+                logger.warning(f"Desconectado del broker MQTT: {e}")
+                await asyncio.sleep(self.reconnect_interval)
@@ -0,0 +1,159 @@
+import asyncio
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from database.queries import to_date
+from database.rollups import period_start, previous_start
+
+# Prefijo de los tópicos internos; los comodines iniciales ('#', '+') no los alcanzan
+STATS_TOPIC_PREFIX = "$stats"
+
+
+def stats_topic(tipo: str, tiempo: str) -> str:
+    return f"{STATS_TOPIC_PREFIX}/{tipo}/{tiempo}"
+
+
+class _Period:
+    """Media acumulada de un periodo: cada lectura cuesta O(1)."""
+
+    __slots__ = ("inicio", "suma", "conteo", "minimo", "maximo")
+
+    def __init__(self, inicio: date, stats: Dict[str, Any] = None):
+        self.inicio = inicio
+        stats = stats or {}
+        self.conteo = stats.get("total", 0)
+        self.suma = stats.get("promedio", 0.0) * self.conteo
+        self.minimo = stats.get("minimo")
+        self.maximo = stats.get("maximo")
+
+    def add(self, value: float):
+        self.suma += value
+        self.conteo += 1
+        self.minimo = value if self.minimo is None else min(self.minimo, value)
+        self.maximo = value if self.maximo is None else max(self.maximo, value)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "promedio": self.suma / self.conteo if self.conteo else 0.0,
+            "total": self.conteo,
+            "minimo": self.minimo,
+            "maximo": self.maximo
+        }
+
+
+class _LiveState:
+    __slots__ = ("tiempo", "actual", "anterior")
+
+    def __init__(self, tiempo: str, aggregates: Optional[Dict[str, Any]]):
+        self.tiempo = tiempo
+        if aggregates:
+            inicio = period_start(to_date(aggregates["ultima"]), tiempo)
+            self.actual = _Period(inicio, aggregates["actual"])
+            self.anterior = _Period(previous_start(inicio, tiempo), aggregates["anterior"])
+        else:
+            inicio = period_start(date.today(), tiempo)
+            self.actual = _Period(inicio)
+            self.anterior = _Period(previous_start(inicio, tiempo))
+
+    def add(self, value: float, fecha: datetime) -> bool:
+        """Suma una lectura al periodo que le corresponde; retorna si algo cambió."""
+        inicio = period_start(to_date(fecha), self.tiempo)
+        if inicio == self.actual.inicio:
+            self.actual.add(value)
+        elif inicio > self.actual.inicio:
+            # Empieza un periodo nuevo: el actual pasa a ser el anterior
+            anterior = previous_start(inicio, self.tiempo)
+            self.anterior = self.actual if anterior == self.actual.inicio else _Period(anterior)
+            self.actual = _Period(inicio)
+            self.actual.add(value)
+        elif inicio == self.anterior.inicio:
+            self.anterior.add(value)
+        else:
+            return False
+        return True
+
+    def aggregates(self) -> Dict[str, Any]:
+        return {
+            "ultima": self.actual.inicio,
+            "actual": self.actual.stats(),
+            "anterior": self.anterior.stats()
+        }
+
+
+class LiveStats:
+    """Mantiene en memoria la media del periodo actual y anterior de cada estadística
+    con suscriptores, y publica la estadística actualizada con cada lote escrito.
+
+    Un lote escrito mientras corre la carga inicial puede o no estar en su
+    resultado; en ese caso la carga se repite (hasta LOAD_ATTEMPTS veces)
+    en lugar de sumar el lote a mano y arriesgar contarlo dos veces.
+    """
+
+    LOAD_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        loader: Callable[[Any, str, str], Awaitable[Optional[Dict[str, Any]]]],
+        formatter: Callable[[str, str, Dict[str, Any]], Dict[str, Any]],
+        publisher: Callable[[str, Dict[str, Any]], None] = None
+    ):
+        self.loader = loader
+        self.formatter = formatter
+        self.publisher = publisher
+
+        self._states: Dict[Tuple[Any, str], _LiveState] = {}
+        self._loading: Dict[Tuple[Any, str], asyncio.Future] = {}
+        # Lotes escritos por modelo, para detectar escrituras durante una carga
+        self._flushes: Dict[Any, int] = {}
+
+    async def activate(self, type_model: Any, fieldname: str, tiempo: str) -> Dict[str, Any]:
+        """Carga (una sola vez) el estado inicial desde la base de datos y retorna la estadística."""
+        key = (type_model, tiempo)
+        if key not in self._states:
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = asyncio.ensure_future(
+                    self._load(type_model, fieldname, tiempo)
+                )
+            try:
+                await asyncio.shield(loading)
+            finally:
+                self._loading.pop(key, None)
+
+        return self.formatter(fieldname, tiempo, self._states[key].aggregates())
+
+    async def _load(self, type_model: Any, fieldname: str, tiempo: str):
+        key = (type_model, tiempo)
+        for attempt in range(self.LOAD_ATTEMPTS):
+            flushes = self._flushes.get(type_model, 0)
+            aggregates = await self.loader(type_model, fieldname, tiempo)
+            if self._flushes.get(type_model, 0) == flushes:
+                break
+        else:
+            logger.warning(f"Estadística {fieldname}/{tiempo} cargada con escrituras en curso; puede omitir el último lote")
+
+        # Sin await desde la consulta: ningún lote puede colarse antes de crear el estado
+        if key not in self._states:
+            self._states[key] = _LiveState(tiempo, aggregates)
+
+    def on_flush(self, type_model: Any, fieldname: str, rows: List[Tuple[float, datetime]]):
+        """Listener del escritor diferido: actualiza y publica las estadísticas activas del modelo."""
+        self._flushes[type_model] = self._flushes.get(type_model, 0) + 1
+        for (model, tiempo), state in self._states.items():
+            if model is not type_model:
+                continue
+
+            changed = False
+            for value, fecha in rows:
+                changed = state.add(value, fecha) or changed
+
+            if changed and self.publisher is not None:
+                try:
+                    self.publisher(
+                        stats_topic(fieldname, tiempo),
+                        self.formatter(fieldname, tiempo, state.aggregates())
+                    )
+                except Exception as e:
+                    logger.error(f"Error publicando estadística {fieldname}/{tiempo}: {e}")
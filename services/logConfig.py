@@ -0,0 +1,53 @@
+import os
+import random
+import sys
+from typing import Any, Callable
+
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Los payloads completos se registran solo en DEBUG y con muestreo
+_payloads_enabled = False
+_payload_sample_rate = 1.0
+
+
+def configure_logging():
+    """Configura loguru con un sink asíncrono (enqueue=True).
+
+    LOG_LEVEL fija el nivel mínimo (INFO por defecto), LOG_FORMAT=json
+    emite un registro JSON por línea y LOG_PAYLOAD_SAMPLE_RATE (0 a 1)
+    indica qué fracción de los payloads se registran cuando LOG_LEVEL
+    es DEBUG o menor.
+    """
+    global _payloads_enabled, _payload_sample_rate
+
+    level = os.getenv("LOG_LEVEL", "INFO").upper()
+    _payload_sample_rate = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
+    _payloads_enabled = logger.level(level).no <= logger.level("DEBUG").no and _payload_sample_rate > 0
+
+    logger.remove()
+    # enqueue=True: el event loop solo encola el registro; un hilo aparte escribe en stderr
+    logger.add(
+        sys.stderr,
+        level=level,
+        enqueue=True,
+        serialize=os.getenv("LOG_FORMAT", "text").lower() == "json",
+        backtrace=False,
+        diagnose=False
+    )
+
+
+def log_payload(message: str, payload: Callable[[], Any]):
+    """Registra un payload completo en DEBUG, muestreado.
+
+    `payload` es una función: no se evalúa (ni se formatea) si los payloads
+    están deshabilitados o si el registro no sale en el muestreo.
+    """
+    if not _payloads_enabled:
+        return
+    if _payload_sample_rate < 1 and random.random() >= _payload_sample_rate:
+        return
+    # El mensaje va como argumento: puede traer datos del cliente (p. ej. el evento)
+    logger.opt(lazy=True, depth=1).debug("{} {}", lambda: message, payload)
@@ -0,0 +1,249 @@
+import functools
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Límites en segundos para latencias: de 100 µs a 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: Dict[str, str] = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), function: Callable[[], float] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Métricas calculadas al exportar (p. ej. la profundidad de una cola)
+        self.function = function
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+    def snapshot(self) -> Any:
+        """Valores en un formato apto para JSON."""
+        return {labels or "": value for name, labels, value in self.samples() if name == self.name}
+
+
+class Counter(_Metric):
+    """Contador monótono, opcionalmente con etiquetas."""
+
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        if self.function is not None:
+            return [(self.name, "", self.function())]
+        return [
+            (self.name, _format_labels(self.labelnames, key), value)
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Valor que sube y baja; con `function` se lee al exportar."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str):
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+
+class _HistogramValues:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(_Metric):
+    """Histograma de buckets fijos; observar cuesta una búsqueda binaria."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, _HistogramValues] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        values = self._values.get(key)
+        if values is None:
+            values = self._values[key] = _HistogramValues(len(self.buckets) + 1)
+        values.counts[bisect_left(self.buckets, value)] += 1
+        values.sum += value
+        values.count += 1
+
+    def time(self, **labels: str) -> "_Timer":
+        """Context manager que observa la duración del bloque."""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        result = []
+        for key, values in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values.counts):
+                cumulative += count
+                result.append((
+                    f"{self.name}_bucket",
+                    _format_labels(self.labelnames, key, {"le": _format_value(float(bound))}),
+                    cumulative
+                ))
+            labels = _format_labels(self.labelnames, key)
+            result.append((f"{self.name}_sum", labels, values.sum))
+            result.append((f"{self.name}_count", labels, values.count))
+        return result
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Estima un cuantil con el límite superior del bucket que lo contiene."""
+        values = self._values.get(self._key(labels))
+        if values is None or not values.count:
+            return None
+        target = q * values.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), values.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> Any:
+        return {
+            _format_labels(self.labelnames, key) or "": {
+                "count": values.count,
+                "sum": values.sum,
+                "p50": self.quantile(0.5, **dict(zip(self.labelnames, key))),
+                "p99": self.quantile(0.99, **dict(zip(self.labelnames, key)))
+            }
+            for key, values in self._values.items()
+        }
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def timed(histogram: Histogram, **labels: str):
+    """Decorador para corrutinas: observa la duración de cada llamada."""
+    def decorator(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Registra la métrica; reemplaza a una anterior con el mismo nombre."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = (), function: Callable[[], float] = None) -> Counter:
+        return self.register(Counter(name, documentation, labelnames, function))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = (), function: Callable[[], float] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Exporta todas las métricas en el formato de texto de Prometheus."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+
+registry = Registry()
+
+# Métricas del camino crítico, compartidas por los módulos que las actualizan
+MQTT_TO_BROADCAST = registry.histogram(
+    "bridge_mqtt_to_broadcast_seconds",
+    "Tiempo desde que llega el mensaje MQTT hasta que se encola a los clientes"
+)
+SEND_LATENCY = registry.histogram(
+    "bridge_ws_send_seconds",
+    "Duración de cada envío a un cliente WebSocket"
+)
+MESSAGES_SENT = registry.counter("bridge_ws_messages_sent_total", "Mensajes enviados a clientes WebSocket")
+MESSAGES_DROPPED = registry.counter(
+    "bridge_ws_messages_dropped_total",
+    "Mensajes descartados por colas de clientes llenas",
+    ["policy"]
+)
+SLOW_CONSUMERS = registry.counter("bridge_ws_slow_consumers_total", "Clientes desconectados por lentos")
+HANDLER_LATENCY = registry.histogram(
+    "bridge_ws_handler_seconds",
+    "Duración del manejo de cada evento WebSocket",
+    ["event"]
+)
+DB_QUERY_LATENCY = registry.histogram(
+    "bridge_db_query_seconds",
+    "Duración de las consultas de estadísticas",
+    ["function"]
+)
+RATE_LIMITED = registry.counter(
+    "bridge_ws_rate_limited_total",
+    "Solicitudes WebSocket rechazadas por superar su tasa",
+    ["scope"]
+)
+DB_SHED = registry.counter("bridge_db_shed_total", "Solicitudes rechazadas con la base de datos saturada")
+REJECTED_CLIENTS = registry.counter("bridge_ws_rejected_clients_total", "Conexiones rechazadas por exceder WS_MAX_CLIENTS")
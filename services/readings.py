@@ -0,0 +1,24 @@
+from typing import Any, Optional
+
+
+def extract_value(data: Any, fieldname: str = None) -> Optional[float]:
+    """Obtiene el valor numérico de una lectura de sensor.
+
+    Acepta payloads numéricos (70, "70") u objetos con 'valor', el nombre
+    del campo ('bpm', 'temperatura') o 'value'. Retorna None si no hay valor.
+    """
+    if isinstance(data, dict):
+        for key in ("valor", fieldname, "value"):
+            if key and key in data:
+                data = data[key]
+                break
+        else:
+            return None
+
+    if isinstance(data, bool):
+        return None
+
+    try:
+        return float(data)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,290 @@
+import asyncio
+import mmap
+import os
+import struct
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Registro de tamaño fijo: tipo (0 = libre), fecha (epoch), valor, largo y bytes del dispositivo
+RECORD = struct.Struct("<BddB64s")
+DEVICE_SIZE = 64
+
+CHECKPOINT = "checkpoint"
+SUFFIX = ".seg"
+
+# Lectura recuperada del spool: (tipo, valor, fecha, dispositivo o None)
+SpooledReading = Tuple[int, float, datetime, Optional[str]]
+# Posición en el spool: (número de segmento, índice del registro)
+Position = Tuple[int, int]
+
+
+class Spool:
+    """Cola persistente de lecturas en archivos de segmento mapeados en memoria.
+
+    Agregar una lectura es copiar un registro de RECORD.size bytes al mmap
+    del segmento activo, sin llamadas al sistema ni a la base de datos. Un
+    segmento lleno se sella y se abre otro; SPOOL_MAX_BYTES limita el
+    total en disco y, al alcanzarlo, las lecturas nuevas se rechazan.
+
+    El archivo `checkpoint` guarda hasta dónde se escribió en la base; al
+    reiniciar se retoma desde ahí, por lo que la entrega es al menos una
+    vez. El byte de tipo se escribe al final de cada registro, así un
+    registro a medio escribir por una caída queda como libre.
+    """
+
+    def __init__(self, directory: str = None, segment_bytes: int = None, max_bytes: int = None):
+        self.directory = directory or os.getenv("SPOOL_DIR", "spool")
+        segment_bytes = segment_bytes or int(os.getenv("SPOOL_SEGMENT_BYTES", 8 * 1024 * 1024))
+        max_bytes = max_bytes or int(os.getenv("SPOOL_MAX_BYTES", 512 * 1024 * 1024))
+        self.segment_records = max(1, segment_bytes // RECORD.size)
+        self.max_segments = max(2, max_bytes // (self.segment_records * RECORD.size))
+
+        self.batch_size = int(os.getenv("SPOOL_DRAIN_BATCH", 5000))
+        self.interval = float(os.getenv("SPOOL_DRAIN_MS", 500)) / 1000
+        self.retry_max = float(os.getenv("SPOOL_RETRY_MAX_S", 30))
+
+        self._segments: List[int] = []
+        self._mmap: Optional[mmap.mmap] = None
+        self._write: Position = (0, 0)
+        self._read: Position = (0, 0)
+        self._dirty = False
+        self._full = False
+
+        # Contadores
+        self.appended = 0
+        self.drained = 0
+        self.rejected = 0
+        self.failures = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._mmap is not None
+
+    @property
+    def pending(self) -> int:
+        """Lecturas escritas en el spool que aún no llegaron a la base."""
+        if not self.is_open:
+            return 0
+        (write_segment, write_index), (read_segment, read_index) = self._write, self._read
+        return (write_segment - read_segment) * self.segment_records + write_index - read_index
+
+    @property
+    def disk_bytes(self) -> int:
+        return len(self._segments) * self.segment_records * RECORD.size
+
+    def _path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:08d}{SUFFIX}")
+
+    def open(self):
+        """Abre el spool y retoma los segmentos y el checkpoint de una ejecución anterior."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._segments = sorted(
+            int(name[:-len(SUFFIX)]) for name in os.listdir(self.directory)
+            if name.endswith(SUFFIX) and name[:-len(SUFFIX)].isdigit()
+        )
+
+        checkpoint = self._load_checkpoint()
+        if checkpoint is not None:
+            for segment in [segment for segment in self._segments if segment < checkpoint[0]]:
+                self._remove(segment)
+        if not self._segments:
+            self._segments.append(checkpoint[0] if checkpoint is not None else 1)
+            self._create(self._segments[0])
+
+        first = self._segments[0]
+        self._read = checkpoint if checkpoint is not None and checkpoint[0] == first else (first, 0)
+
+        # El último segmento sigue siendo el activo: se escribe tras su último registro ocupado
+        active = self._segments[-1]
+        self._mmap = self._map(active)
+        index = 0
+        while index < self.segment_records and self._mmap[index * RECORD.size]:
+            index += 1
+        self._write = (active, index)
+
+        if self.pending:
+            logger.info(f"Spool con {self.pending} lecturas pendientes en {self.directory}")
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+
+    def append(self, kind: int, value: float, fecha: datetime, dispositivo: str = None) -> bool:
+        """Agrega una lectura; retorna False si el spool alcanzó SPOOL_MAX_BYTES."""
+        segment, index = self._write
+        if index >= self.segment_records:
+            if len(self._segments) >= self.max_segments:
+                self.rejected += 1
+                if not self._full:
+                    self._full = True
+                    logger.error(f"Spool lleno ({self.disk_bytes} bytes): se descartan lecturas")
+                return False
+            self._seal(segment + 1)
+            segment, index = self._write
+
+        device = dispositivo.encode()[:DEVICE_SIZE] if dispositivo else b""
+        record = RECORD.pack(kind, fecha.timestamp(), value, len(device), device)
+        offset = index * RECORD.size
+        # El tipo va al final: hasta entonces el registro se lee como libre
+        self._mmap[offset + 1:offset + RECORD.size] = record[1:]
+        self._mmap[offset] = kind
+
+        self._write = (segment, index + 1)
+        self._dirty = True
+        self.appended += 1
+        return True
+
+    def read(self, limit: int) -> Tuple[List[SpooledReading], Position]:
+        """Lee hasta `limit` lecturas desde el checkpoint, sin avanzarlo.
+
+        Retorna las lecturas y la posición que hay que pasar a commit()
+        una vez que quedaron guardadas.
+        """
+        readings: List[SpooledReading] = []
+        segment, index = self._read
+        write_segment, write_index = self._write
+
+        while len(readings) < limit:
+            end = write_index if segment == write_segment else self.segment_records
+            if index >= end:
+                if segment >= write_segment:
+                    break
+                segment, index = segment + 1, 0
+                continue
+
+            count = min(end - index, limit - len(readings))
+            start, stop = index * RECORD.size, (index + count) * RECORD.size
+            if segment == write_segment:
+                data = self._mmap[start:stop]
+            else:
+                with open(self._path(segment), "rb") as file:
+                    file.seek(start)
+                    data = file.read(stop - start)
+
+            for kind, timestamp, value, size, device in RECORD.iter_unpack(data):
+                if not kind:
+                    # Segmento sellado con un registro perdido en una caída: se salta el resto
+                    index = end
+                    break
+                readings.append((
+                    kind,
+                    value,
+                    datetime.fromtimestamp(timestamp),
+                    device[:size].decode(errors="ignore") if size else None
+                ))
+                index += 1
+
+        return readings, (segment, index)
+
+    def commit(self, position: Position):
+        """Avanza el checkpoint y borra los segmentos ya escritos en la base."""
+        segment, index = position
+        if index >= self.segment_records and segment < self._write[0]:
+            segment, index = segment + 1, 0
+        pending = self.pending
+        self._read = (segment, index)
+        self.drained += pending - self.pending
+
+        temporary = os.path.join(self.directory, CHECKPOINT + ".tmp")
+        with open(temporary, "w") as file:
+            file.write(f"{segment} {index}\n")
+        os.replace(temporary, os.path.join(self.directory, CHECKPOINT))
+
+        for old in [old for old in self._segments if old < segment]:
+            self._remove(old)
+        self._full = False
+
+    def sync(self):
+        """Baja al disco las páginas modificadas del segmento activo.
+
+        Sin esto las lecturas ya sobreviven a una caída del proceso (quedan
+        en la caché de páginas del sistema); sync las protege de una caída
+        del equipo.
+        """
+        if self._dirty and self._mmap is not None:
+            self._mmap.flush()
+            self._dirty = False
+
+    async def drain(self, sink: Callable[[List[SpooledReading]], Awaitable[Any]]):
+        """Entrega las lecturas pendientes a `sink` en lotes de SPOOL_DRAIN_BATCH.
+
+        El checkpoint avanza solo si `sink` termina sin error. Mientras la
+        base falle se reintenta con espera exponencial hasta
+        SPOOL_RETRY_MAX_S; las lecturas siguen acumulándose en disco.
+        """
+        delay = self.interval
+        while True:
+            self.sync()
+            readings, position = self.read(self.batch_size)
+            if not readings:
+                await asyncio.sleep(self.interval)
+                continue
+
+            try:
+                await sink(readings)
+            except Exception as e:
+                self.failures += 1
+                if delay == self.interval:
+                    logger.warning(f"No se pudo drenar el spool ({self.pending} pendientes): {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+                continue
+
+            if delay != self.interval:
+                logger.info(f"Base de datos disponible, drenando {self.pending} lecturas del spool")
+                delay = self.interval
+            self.commit(position)
+            if len(readings) < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending,
+            "appended": self.appended,
+            "drained": self.drained,
+            "rejected": self.rejected,
+            "failures": self.failures,
+            "diskBytes": self.disk_bytes
+        }
+
+    def _load_checkpoint(self) -> Optional[Position]:
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT)) as file:
+                segment, index = file.read().split()
+            return int(segment), int(index)
+        except (OSError, ValueError):
+            return None
+
+    def _create(self, segment: int):
+        with open(self._path(segment), "wb") as file:
+            file.truncate(self.segment_records * RECORD.size)
+
+    def _map(self, segment: int) -> mmap.mmap:
+        size = self.segment_records * RECORD.size
+        with open(self._path(segment), "r+b") as file:
+            if os.fstat(file.fileno()).st_size < size:
+                file.truncate(size)
+            return mmap.mmap(file.fileno(), size)
+
+    def _seal(self, segment: int):
+        """Cierra el segmento activo y abre `segment` como el nuevo activo."""
+        self._mmap.flush()
+        self._mmap.close()
+        self._create(segment)
+        self._segments.append(segment)
+        self._mmap = self._map(segment)
+        self._write = (segment, 0)
+
+    def _remove(self, segment: int):
+        try:
+            os.remove(self._path(segment))
+        except FileNotFoundError:
+            pass
+        self._segments.remove(segment)
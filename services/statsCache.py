@@ -0,0 +1,140 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from database.conn import read_from_primary
+from database.queries import to_date
+from database.rollups import period_start
+
+load_dotenv()
+
+
+class _Entry:
+    __slots__ = ("value", "expires", "anterior_start")
+
+    def __init__(self, value: Dict[str, Any], expires: float, anterior_start: Optional[date]):
+        self.value = value
+        self.expires = expires
+        self.anterior_start = anterior_start
+
+
+class StatsCache:
+    """Caché TTL/LRU de respuestas de estadísticas con llaves (modelo, tiempo).
+
+    Las consultas idénticas concurrentes comparten una sola carga. Una
+    escritura solo invalida las entradas cuyo periodo actual o anterior
+    contiene la fecha escrita: los periodos más antiguos ya no cambian.
+
+    Con réplica de lectura, las cargas de un modelo durante
+    DB_REPLICA_LAG_S segundos tras una invalidación van a la conexión
+    principal: la réplica puede no tener aún las filas recién escritas y
+    la respuesta obsoleta quedaría en caché todo el TTL.
+    """
+
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("STATS_CACHE_TTL", 30))
+        self.max_entries = max_entries or int(os.getenv("STATS_CACHE_SIZE", 256))
+        self.replica_lag = float(os.getenv("DB_REPLICA_LAG_S", 5))
+
+        self._entries: "OrderedDict[Tuple[Any, str], _Entry]" = OrderedDict()
+        self._inflight: Dict[Tuple[Any, str], asyncio.Future] = {}
+        # Se incrementa con cada invalidación para descartar cargas ya obsoletas
+        self._generations: Dict[Any, int] = {}
+        # Momento (monotonic) de la última invalidación de cada modelo
+        self._invalidated: Dict[Any, float] = {}
+
+        # Contadores
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, key: Tuple[Any, str], loader: Callable[[], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+        """Retorna la respuesta en caché o la carga una sola vez para todos los que esperan."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        model = key[0]
+        generation = self._generations.get(model, 0)
+        if time.monotonic() - self._invalidated.get(model, float("-inf")) < self.replica_lag:
+            # La tarea copia el contexto al crearse: toda la carga lee de la principal
+            with read_from_primary():
+                task = asyncio.ensure_future(loader())
+        else:
+            task = asyncio.ensure_future(loader())
+        self._inflight[key] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+
+        if self._generations.get(model, 0) == generation:
+            self._store(key, value)
+        return value
+
+    def _store(self, key: Tuple[Any, str], value: Optional[Dict[str, Any]]):
+        # Solo se guardan respuestas exitosas que indican sus periodos
+        if not value or not value.get("success") or "inicioAnterior" not in value:
+            return
+
+        self._entries[key] = _Entry(
+            value,
+            time.monotonic() + self.ttl,
+            to_date(value["inicioAnterior"])
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, model: Any, fechas: List[datetime]):
+        """Descarta las entradas del modelo afectadas por lecturas en las fechas dadas."""
+        if not fechas:
+            return
+
+        self._generations[model] = self._generations.get(model, 0) + 1
+        self._invalidated[model] = time.monotonic()
+        days = {to_date(fecha) for fecha in fechas}
+        for key in [key for key in self._entries if key[0] == model]:
+            _, tiempo = key
+            entry = self._entries[key]
+            if any(period_start(day, tiempo) >= entry.anterior_start for day in days):
+                del self._entries[key]
+                self.invalidations += 1
+
+    def on_flush(self, model: Any, fieldname: str, rows: List[Tuple[float, datetime]]):
+        """Listener del escritor diferido: invalida según las fechas del lote escrito."""
+        self.invalidate(model, [fecha for _, fecha in rows])
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+
+stats_cache = StatsCache()
@@ -0,0 +1,104 @@
+import asyncio
+import math
+import os
+from array import array
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# numpy es opcional y se importa en el primer cálculo, no al arrancar el servicio
+_numpy = None
+
+
+def _load_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+def _percentile(ordered: array, q: float) -> float:
+    """Percentil con interpolación lineal (mismo criterio que numpy.percentile)."""
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def describe(values: array) -> Dict[str, Any]:
+    """Calcula conteo, media, mediana, p95, desviación estándar, mínimo y máximo.
+
+    Se ejecuta fuera del event loop sobre un arreglo columnar de floats.
+    """
+    if not len(values):
+        return {"total": 0, "promedio": 0.0, "mediana": None, "p95": None, "desviacion": None, "minimo": None, "maximo": None}
+
+    np = _load_numpy()
+    if np is not None:
+        data = np.frombuffer(values, dtype=np.float64)
+        median, p95 = np.percentile(data, [50, 95])
+        return {
+            "total": int(data.size),
+            "promedio": float(data.mean()),
+            "mediana": float(median),
+            "p95": float(p95),
+            "desviacion": float(data.std()),
+            "minimo": float(data.min()),
+            "maximo": float(data.max())
+        }
+
+    ordered = array("d", sorted(values))
+    total = len(ordered)
+    mean = math.fsum(ordered) / total
+    return {
+        "total": total,
+        "promedio": mean,
+        "mediana": _percentile(ordered, 50),
+        "p95": _percentile(ordered, 95),
+        "desviacion": math.sqrt(math.fsum((value - mean) ** 2 for value in ordered) / total),
+        "minimo": ordered[0],
+        "maximo": ordered[-1]
+    }
+
+
+class StatsEngine:
+    """Ejecuta los cálculos estadísticos en un pool de hilos o de procesos.
+
+    STATS_EXECUTOR=thread (por defecto) sirve con numpy, que libera el GIL;
+    STATS_EXECUTOR=process aísla cálculos puramente en Python.
+    """
+
+    def __init__(self, mode: str = None, workers: int = None):
+        self.mode = mode or os.getenv("STATS_EXECUTOR", "thread")
+        self.workers = workers or int(os.getenv("STATS_WORKERS", min(4, os.cpu_count() or 1)))
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stats")
+        return self._executor
+
+    async def describe(self, values: Iterable[float]) -> Dict[str, Any]:
+        """Calcula las estadísticas de los valores sin bloquear el event loop."""
+        columnar = values if isinstance(values, array) else array("d", values)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, describe, columnar)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+stats_engine = StatsEngine()
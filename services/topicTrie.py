@@ -0,0 +1,98 @@
+from typing import Any, Dict, List, Set
+
+SINGLE_LEVEL = "+"
+MULTI_LEVEL = "#"
+
+
+class _Node:
+    __slots__ = ("children", "subscribers")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.subscribers: Set[Any] = set()
+
+
+class TopicTrie:
+    """Índice de suscripciones por nivel de tópico con comodines estilo MQTT.
+
+    Resolver un tópico solo recorre las ramas que coinciden con él, por lo que
+    el costo es proporcional a los suscriptores que lo reciben y no al total
+    de clientes conectados.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+
+    @staticmethod
+    def is_valid(pattern: str) -> bool:
+        """Valida un filtro de tópico: '+' ocupa un nivel y '#' solo va al final."""
+        if not isinstance(pattern, str) or not pattern:
+            return False
+
+        levels = pattern.split("/")
+        for index, level in enumerate(levels):
+            if MULTI_LEVEL in level and (level != MULTI_LEVEL or index != len(levels) - 1):
+                return False
+            if SINGLE_LEVEL in level and level != SINGLE_LEVEL:
+                return False
+        return True
+
+    def subscribe(self, pattern: str, subscriber: Any) -> bool:
+        """Agrega un suscriptor al filtro; retorna False si ya existía."""
+        node = self._root
+        for level in pattern.split("/"):
+            node = node.children.setdefault(level, _Node())
+
+        if subscriber in node.subscribers:
+            return False
+        node.subscribers.add(subscriber)
+        return True
+
+    def unsubscribe(self, pattern: str, subscriber: Any) -> bool:
+        """Quita un suscriptor del filtro y poda las ramas que quedan vacías."""
+        path: List[tuple] = []
+        node = self._root
+        for level in pattern.split("/"):
+            child = node.children.get(level)
+            if child is None:
+                return False
+            path.append((node, level))
+            node = child
+
+        if subscriber not in node.subscribers:
+            return False
+        node.subscribers.discard(subscriber)
+
+        for parent, level in reversed(path):
+            child = parent.children[level]
+            if child.subscribers or child.children:
+                break
+            del parent.children[level]
+        return True
+
+    def match(self, topic: str) -> Set[Any]:
+        """Retorna los suscriptores cuyos filtros coinciden con el tópico."""
+        result: Set[Any] = set()
+        levels = topic.split("/")
+        # Igual que en MQTT, los comodines iniciales no coinciden con tópicos '$...'
+        self._match(self._root, levels, 0, result, levels[0].startswith("$"))
+        return result
+
+    def _match(self, node: _Node, levels: List[str], index: int, result: Set[Any], system: bool):
+        wildcards = not (system and index == 0)
+
+        multi = node.children.get(MULTI_LEVEL) if wildcards else None
+        if multi is not None:
+            result.update(multi.subscribers)
+
+        if index == len(levels):
+            result.update(node.subscribers)
+            return
+
+        child = node.children.get(levels[index])
+        if child is not None:
+            self._match(child, levels, index + 1, result, system)
+
+        single = node.children.get(SINGLE_LEVEL) if wildcards else None
+        if single is not None:
+            self._match(single, levels, index + 1, result, system)
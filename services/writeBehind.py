@@ -0,0 +1,235 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+from loguru import logger
+from dotenv import load_dotenv
+from tortoise.models import Model
+from tortoise.transactions import in_transaction
+from database.rollups import apply_rollups
+
+load_dotenv()
+
+# Lectura pendiente: (valor, fecha, columnas extra, futuro del llamador o None)
+Reading = Tuple[float, datetime, Dict[str, Any], Optional[asyncio.Future]]
+
+
+class _Buffer:
+    __slots__ = ("fieldname", "readings", "timer", "lock", "scheduled")
+
+    def __init__(self, fieldname: str):
+        self.fieldname = fieldname
+        self.readings: List[Reading] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.lock = asyncio.Lock()
+        # Hay una tarea de escritura programada o en curso para este buffer
+        self.scheduled = False
+
+
+class WriteBehindWriter:
+    """Acumula lecturas en memoria y las persiste con bulk_create por lotes.
+
+    Un lote se escribe al alcanzar WRITE_BATCH_SIZE lecturas o tras
+    WRITE_FLUSH_MS milisegundos; los llamadores que esperan confirmación
+    solo la reciben cuando su lote quedó escrito en la base de datos.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        flush_ms: float = None,
+        max_retries: int = None,
+        retry_backoff_ms: float = None,
+        max_pending: int = None
+    ):
+        self.batch_size = batch_size or int(os.getenv("WRITE_BATCH_SIZE", 500))
+        self.flush_interval = (flush_ms or float(os.getenv("WRITE_FLUSH_MS", 200))) / 1000
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("WRITE_MAX_RETRIES", 3))
+        self.retry_backoff = (retry_backoff_ms or float(os.getenv("WRITE_RETRY_BACKOFF_MS", 100))) / 1000
+        self.max_pending = max_pending or int(os.getenv("WRITE_MAX_PENDING", 100000))
+
+        self._buffers: Dict[Type[Model], _Buffer] = {}
+        self._flushes: set = set()
+        self._listeners: List[Callable[[Type[Model], str, List[Tuple[float, datetime]]], Any]] = []
+
+        # Contadores
+        self.written = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retries = 0
+
+    def add_flush_listener(self, listener: Callable[[Type[Model], str, List[Tuple[float, datetime]]], Any]):
+        """Registra una función que recibe cada lote después de escribirse."""
+        self._listeners.append(listener)
+
+    @property
+    def pending(self) -> int:
+        return sum(len(buffer.readings) for buffer in self._buffers.values())
+
+    def submit(
+        self,
+        model: Type[Model],
+        fieldname: str,
+        value: float,
+        fecha: datetime = None,
+        wait: bool = False,
+        extra: Dict[str, Any] = None
+    ) -> Optional[asyncio.Future]:
+        """Agrega una lectura al buffer del modelo.
+
+        extra lleva columnas opcionales de la lectura (p. ej. dispositivo).
+        Con wait=True retorna un futuro que se resuelve tras la escritura del
+        lote. Lanza RuntimeError si el buffer está lleno.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise RuntimeError("Buffer de escritura lleno")
+
+        loop = asyncio.get_running_loop()
+        buffer = self._buffers.get(model)
+        if buffer is None:
+            buffer = self._buffers[model] = _Buffer(fieldname)
+
+        future = loop.create_future() if wait else None
+        buffer.readings.append((value, fecha or datetime.now(), extra or {}, future))
+
+        if len(buffer.readings) >= self.batch_size:
+            self._schedule_flush(model)
+        elif buffer.timer is None:
+            buffer.timer = loop.call_later(self.flush_interval, self._schedule_flush, model)
+        return future
+
+    async def write(self, model: Type[Model], fieldname: str, value: float, fecha: datetime = None, extra: Dict[str, Any] = None):
+        """Agrega una lectura y espera a que quede persistida."""
+        await self.submit(model, fieldname, value, fecha, wait=True, extra=extra)
+
+    def _schedule_flush(self, model: Type[Model]):
+        buffer = self._buffers[model]
+        if buffer.timer is not None:
+            buffer.timer.cancel()
+            buffer.timer = None
+
+        # Una sola tarea por buffer: al terminar revisa si quedó otro lote
+        if buffer.scheduled:
+            return
+        buffer.scheduled = True
+        task = asyncio.create_task(self._run_flush(model))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _run_flush(self, model: Type[Model]):
+        buffer = self._buffers[model]
+        try:
+            await self._flush_model(model)
+        finally:
+            buffer.scheduled = False
+
+        # Si mientras tanto se llenó otro lote, escribirlo sin esperar al temporizador
+        if len(buffer.readings) >= self.batch_size:
+            self._schedule_flush(model)
+        elif buffer.readings and buffer.timer is None:
+            buffer.timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, self._schedule_flush, model
+            )
+
+    async def flush(self):
+        """Escribe de inmediato todas las lecturas pendientes."""
+        for model, buffer in list(self._buffers.items()):
+            if buffer.timer is not None:
+                buffer.timer.cancel()
+                buffer.timer = None
+            while buffer.readings:
+                await self._flush_model(model)
+
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def _flush_model(self, model: Type[Model]):
+        buffer = self._buffers[model]
+        async with buffer.lock:
+            if not buffer.readings:
+                return
+            readings = buffer.readings[:self.batch_size]
+            del buffer.readings[:self.batch_size]
+
+            rows = [(value, fecha) for value, fecha, _, _ in readings]
+            error = None
+            for attempt in range(self.max_retries + 1):
+                try:
+                    await self._persist(model, buffer.fieldname, readings)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+                    if attempt < self.max_retries:
+                        self.retries += 1
+                        await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+            if error is not None:
+                self.failed += len(rows)
+                logger.error(f"No se pudieron guardar {len(rows)} registros de {model.__name__}: {error}")
+            else:
+                self.written += len(rows)
+
+            for _, _, _, future in readings:
+                if future is not None and not future.done():
+                    if error is None:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(error)
+
+        if error is None:
+            self._notify(model, buffer.fieldname, rows)
+
+    async def _persist(self, model: Type[Model], fieldname: str, readings: List[Reading]):
+        """Inserta un lote de lecturas y actualiza sus agregados en la misma transacción."""
+        async with in_transaction("default") as connection:
+            await self._insert(model, fieldname, readings, connection)
+
+    async def _insert(self, model: Type[Model], fieldname: str, readings: List[Reading], connection):
+        await model.bulk_create([
+            model(**{fieldname: value, "fecha": fecha, **extra}) for value, fecha, extra, _ in readings
+        ], using_db=connection)
+        await apply_rollups(model, [(value, fecha) for value, fecha, _, _ in readings], connection)
+
+    async def write_batch(self, batches: List[Tuple[Type[Model], str, List[Tuple[float, datetime, Dict[str, Any]]]]]):
+        """Persiste de inmediato lotes ya armados (p. ej. drenados del spool), sin pasar por el buffer.
+
+        `batches` es una lista de (modelo, campo, filas); todos se escriben
+        en una sola transacción, así un reintento no duplica los lotes que sí
+        habían entrado. Lanza la excepción de la base de datos si falla;
+        reintentar queda a cargo del llamador.
+        """
+        async with in_transaction("default") as connection:
+            for model, fieldname, rows in batches:
+                await self._insert(model, fieldname, [(value, fecha, extra, None) for value, fecha, extra in rows], connection)
+
+        for model, fieldname, rows in batches:
+            self.written += len(rows)
+            self._notify(model, fieldname, [(value, fecha) for value, fecha, _ in rows])
+
+    def notify(self, model: Type[Model], fieldname: str, rows: List[Tuple[float, datetime]], skip: Callable = None):
+        """Entrega a los listeners un lote escrito por otro proceso del clúster, omitiendo `skip`."""
+        self._notify(model, fieldname, rows, skip)
+
+    def _notify(self, model: Type[Model], fieldname: str, rows: List[Tuple[float, datetime]], skip: Callable = None):
+        for listener in self._listeners:
+            if skip is not None and listener == skip:
+                continue
+            try:
+                listener(model, fieldname, rows)
+            except Exception as e:
+                logger.error(f"Error notificando escritura de {model.__name__}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.pending,
+            "written": self.written,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "retries": self.retries
+        }
+
+
+writer = WriteBehindWriter()
@@ -0,0 +1,215 @@
+"""Broker MQTT 3.1.1 mínimo para pruebas locales del bridge (sin mosquitto).
+
+Soporta CONNECT, SUBSCRIBE/UNSUBSCRIBE con comodines, PUBLISH QoS 0/1/2
+(la entrega a suscriptores es siempre QoS 0), PINGREQ y DISCONNECT. No
+valida credenciales ni guarda mensajes retenidos o sesiones.
+
+    python -m tools.fakeBroker --port 1883 --rate 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import struct
+from typing import Dict, Optional, Set
+
+from loguru import logger
+
+from services.topicTrie import TopicTrie
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def _remaining_length(size: int) -> bytes:
+    encoded = bytearray()
+    while True:
+        byte, size = size % 128, size // 128
+        encoded.append(byte | 0x80 if size else byte)
+        if not size:
+            return bytes(encoded)
+
+
+def _packet(packet_type: int, body: bytes, flags: int = 0) -> bytes:
+    return bytes([packet_type << 4 | flags]) + _remaining_length(len(body)) + body
+
+
+def _string(value: bytes, offset: int):
+    size = struct.unpack_from(">H", value, offset)[0]
+    return value[offset + 2:offset + 2 + size], offset + 2 + size
+
+
+def publish_packet(topic: str, payload: bytes) -> bytes:
+    topic_bytes = topic.encode()
+    return _packet(PUBLISH, struct.pack(">H", len(topic_bytes)) + topic_bytes + payload)
+
+
+class _Client:
+    __slots__ = ("writer", "client_id", "subscriptions")
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.client_id = ""
+        self.subscriptions: Set[str] = set()
+
+
+class FakeBroker:
+    """Broker en memoria: difunde cada PUBLISH a los clientes con un filtro que coincide."""
+
+    def __init__(self, host: str = "localhost", port: int = 1883):
+        self.host = host
+        self.port = port
+        self.topics = TopicTrie()
+        self.clients: Dict[asyncio.StreamWriter, _Client] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+        self.published = 0
+        self.delivered = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Broker MQTT de prueba en {self.host}:{self.port}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for client in list(self.clients.values()):
+                client.writer.close()
+            await self._server.wait_closed()
+
+    def publish(self, topic: str, payload: bytes):
+        """Entrega un mensaje a los suscriptores, como si lo hubiera publicado un cliente."""
+        self.published += 1
+        subscribers = self.topics.match(topic)
+        if not subscribers:
+            return
+        packet = publish_packet(topic, payload)
+        for client in subscribers:
+            client.writer.write(packet)
+            self.delivered += 1
+
+    async def _read_packet(self, reader: asyncio.StreamReader):
+        header = (await reader.readexactly(1))[0]
+        size, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            size += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(size) if size else b""
+        return header >> 4, header & 0x0F, body
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = _Client(writer)
+        self.clients[writer] = client
+        try:
+            while True:
+                packet_type, flags, body = await self._read_packet(reader)
+
+                if packet_type == CONNECT:
+                    # Protocolo, nivel, flags y keepalive ocupan 10 bytes; después va el client id
+                    client.client_id = _string(body, 10)[0].decode(errors="replace")
+                    writer.write(_packet(CONNACK, b"\x00\x00"))
+
+                elif packet_type == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    topic, offset = _string(body, 0)
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        writer.write(_packet(PUBACK if qos == 1 else PUBREC, packet_id))
+                    self.publish(topic.decode(), body[offset:])
+
+                elif packet_type == PUBREL:
+                    writer.write(_packet(PUBCOMP, body[:2]))
+
+                elif packet_type == SUBSCRIBE:
+                    packet_id, offset, granted = body[:2], 2, bytearray()
+                    while offset < len(body):
+                        pattern, offset = _string(body, offset)
+                        offset += 1  # QoS pedido: siempre se concede 0
+                        pattern = pattern.decode()
+                        if TopicTrie.is_valid(pattern):
+                            self.topics.subscribe(pattern, client)
+                            client.subscriptions.add(pattern)
+                            granted.append(0)
+                        else:
+                            granted.append(0x80)
+                    writer.write(_packet(SUBACK, packet_id + bytes(granted)))
+
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id, offset = body[:2], 2
+                    while offset < len(body):
+                        pattern, offset = _string(body, offset)
+                        self.topics.unsubscribe(pattern.decode(), client)
+                        client.subscriptions.discard(pattern.decode())
+                    writer.write(_packet(UNSUBACK, packet_id))
+
+                elif packet_type == PINGREQ:
+                    writer.write(_packet(PINGRESP, b""))
+
+                elif packet_type == DISCONNECT:
+                    break
+
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # Cancelado al cerrar el broker: se termina sin propagar
+            pass
+        finally:
+            for pattern in client.subscriptions:
+                self.topics.unsubscribe(pattern, client)
+            self.clients.pop(writer, None)
+            writer.close()
+
+
+def sample_reading(topic: str) -> bytes:
+    """Lectura sintética con la forma que publican los sensores."""
+    if topic == "sensor/bpm":
+        return json.dumps({"bpm": random.randint(55, 120)}).encode()
+    if topic == "sensor/temperatura":
+        return json.dumps({"temperatura": round(random.uniform(35.5, 38.5), 2)}).encode()
+    return json.dumps({"distancia": round(random.uniform(0, 200), 1)}).encode()
+
+
+async def generate(broker: FakeBroker, topics, rate: float):
+    """Publica `rate` lecturas sintéticas por segundo repartidas entre los tópicos."""
+    interval = 1 / rate
+    while True:
+        for topic in topics:
+            broker.publish(topic, sample_reading(topic))
+            await asyncio.sleep(interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Broker MQTT de prueba")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--rate", type=float, default=0, help="Lecturas sintéticas por segundo (0 = ninguna)")
+    parser.add_argument("--topics", default="sensor/bpm,sensor/temperatura,sensor/distancia")
+    args = parser.parse_args()
+
+    broker = FakeBroker(args.host, args.port)
+    await broker.start()
+    if args.rate > 0:
+        asyncio.create_task(generate(broker, args.topics.split(","), args.rate))
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass